@@ -135,16 +135,49 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import altair as alt
+import pyarrow as pa
+import pyarrow.compute as pc
+import io
 import os
-from io import BytesIO
+import time
 
 from rca_agent_new import (
-    read_multiple_tables,
-    process_rca,
-    add_kpi_label_column,
     plot_rca_drivers,
+    build_driver_chart_data,
+    CHART_VALUE_COLUMN,
+    arrow_project,
+    arrow_top_k,
+    arrow_to_parquet_bytes,
+    CONTRIBUTION_MODES,
+    INPUT_FORMATS,
+    select_top_k,
+    add_kpi_label_column,
+    filter_rca_table,
+    sort_rca_table,
+    page_rca_table,
+    higher_value_styles,
     generate_structured_rca_text,
-    save_rca_text,
+    SectionResultCache,
+    WhatIfModel,
+)
+from rca_hierarchy import (
+    read_long_table,
+    HierarchicalRca,
+    search_driver_combinations,
+    generate_combination_rca_text,
+)
+from rca_jobs import (
+    JobQueueFull,
+    ResultCache,
+    parse_sheet_name,
+    workbook_digest,
+    runner_from_env,
+    run_single_file_rca,
+    run_compare_rca,
+    SINGLE_FILE_STAGES,
+    COMPARE_STAGES,
 )
 
 
@@ -154,22 +187,254 @@ st.set_page_config(
 )
 
 
-def parse_sheet_name(raw):
-    try:
-        return int(raw)
-    except ValueError:
-        return raw
+CONTRIBUTION_MODE_HELP = (
+    "total: share of the net total change (original). "
+    "gross: share of all movement, |change| summed; stays within ±100% when "
+    "ups and downs cancel out. auto: total, unless the net total is near zero."
+)
+
+
+@st.cache_resource
+def get_job_runner():
+    # One runner per server process, shared by every session, so the
+    # RCA_MAX_JOBS limit applies to all users together.
+    return runner_from_env()
+
+
+@st.cache_resource
+def get_result_cache():
+    # RCA results by workbook digest, shared by all sessions of this server
+    return ResultCache()
+
+
+@st.cache_resource(max_entries=4)
+def get_long_table(digest, _file_bytes, _sheet_name):
+    # long sheets can be millions of rows: parse once per workbook/sheet
+    return read_long_table(io.BytesIO(_file_bytes), sheet_name=_sheet_name)
+
+
+@st.cache_resource(max_entries=8)
+def get_hierarchy_model(digest, hierarchy, _long_table):
+    # rollups and expanded nodes live on the model, so keep it across reruns
+    return HierarchicalRca(_long_table, list(hierarchy))
+
+
+@st.cache_resource(max_entries=8)
+def get_driver_combinations(digest, dims, max_order, min_contribution, _long_table):
+    return search_driver_combinations(
+        _long_table,
+        list(dims),
+        max_order=max_order,
+        min_contribution=min_contribution
+    )
+
+
+def show_job_status(runner, job, cancel_key):
+    """
+    Render progress / outcome of a background job.
+    Returns True while the job is still queued or running.
+    """
+    if job is None:
+        return False
+
+    if not job.finished:
+        st.progress(min(job.progress, 1.0), text=job.describe())
+        if job.status == "queued":
+            st.caption(
+                f"Server load: {runner.running_count()} running, "
+                f"{runner.queued_count()} waiting."
+            )
+        if job.cancel_requested:
+            st.caption("Cancelling...")
+        elif st.button("Cancel", key=cancel_key):
+            runner.cancel(job.id)
+        return True
+
+    if job.status == "failed":
+        st.error(f"RCA run failed: {job.error}")
+    elif job.status == "cancelled":
+        st.info("RCA run cancelled.")
+    return False
+
+
+def show_results_browser(table, key, sort_default, style=None):
+    """
+    Filter / sort / page an Arrow result table. All of it runs on the Arrow
+    table; only the visible page is converted for display.
+    style(df) may return a pandas Styler for the page.
+    """
+    sections = table["Section"].unique().to_pylist()
+    numeric_cols = [
+        field.name for field in table.schema
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type)
+    ]
+
+    f1, f2, f3, f4 = st.columns([2, 2, 2, 1])
+    chosen_sections = f1.multiselect(
+        "Sections", [str(sec) for sec in sections], key=f"{key}_sections"
+    )
+    search = f2.text_input("Segment contains", key=f"{key}_search")
+    sort_col = f3.selectbox(
+        "Sort by",
+        numeric_cols,
+        index=numeric_cols.index(sort_default) if sort_default in numeric_cols else 0,
+        key=f"{key}_sort"
+    )
+    ascending = f4.checkbox("Ascending", key=f"{key}_asc")
+
+    view = sort_rca_table(
+        filter_rca_table(table, sections=chosen_sections, search=search),
+        sort_col,
+        ascending=ascending
+    )
+
+    p1, p2 = st.columns([1, 1])
+    page_size = p1.selectbox(
+        "Rows per page", [25, 50, 100, 250], key=f"{key}_page_size"
+    )
+    n_pages = max(1, -(-view.num_rows // page_size))
+    page = p2.number_input(
+        f"Page (of {n_pages})",
+        min_value=1,
+        max_value=n_pages,
+        value=1,
+        step=1,
+        key=f"{key}_page"
+    )
+    page_table, _ = page_rca_table(view, int(page), page_size)
+
+    st.caption(f"{view.num_rows:,} of {table.num_rows:,} rows match")
+    # styling needs a pandas frame; otherwise the Arrow page goes out as is
+    st.dataframe(
+        style(page_table.to_pandas()) if style is not None else page_table,
+        use_container_width=True
+    )
+
+
+def driver_chart(data, color):
+    """
+    Bar chart of one side of build_driver_chart_data, drawn in the browser
+    (Vega-Lite): only the top-N rows are sent, with hover tooltips.
+    """
+    return (
+        alt.Chart(data)
+        .mark_bar(color=color)
+        .encode(
+            x=alt.X(
+                "KPI Segment Label:N",
+                sort=None,
+                title="KPI Segment",
+                axis=alt.Axis(labelAngle=-45)
+            ),
+            y=alt.Y(f"{CHART_VALUE_COLUMN}:Q", title="Contribution to Absolute Change (%)"),
+            tooltip=[
+                "KPI Segment Label",
+                alt.Tooltip(f"{CHART_VALUE_COLUMN}:Q", format="+.2f")
+            ]
+        )
+        .properties(height=400)
+    )
+
 
+@st.fragment
+def show_what_if(model, brand_name):
+    """
+    Override one segment's Post or Absolute Change at a time and show the
+    resulting drivers. A fragment: slider moves rerun only this block, and
+    only update the model (see WhatIfModel), not the pipeline.
+    """
+    base = model.base
+    names = [str(sec) for sec in model.sections]
+    w1, w2, w3 = st.columns([2, 3, 2])
+    section = w1.selectbox(
+        "Section",
+        range(len(names)),
+        # tables sharing a name are told apart by their number
+        format_func=lambda n: names[n] if names.count(names[n]) == 1 else f"{names[n]} #{n + 1}",
+        key="whatif_section"
+    )
+    rows = model.section_rows(section).tolist()
+    row = w2.selectbox(
+        "Segment",
+        rows,
+        format_func=lambda r: str(base.at[r, "KPI Segment Label"]),
+        key="whatif_segment"
+    )
+    field = w3.radio(
+        "Override", ["Post", "Absolute Change"], horizontal=True, key="whatif_field"
+    )
+
+    b1, b2, _ = st.columns([1, 1, 4])
+    reset_row = b1.button("Reset segment", key="whatif_reset_row")
+    reset_all = b2.button("Reset all", key="whatif_reset_all")
+    if reset_row or reset_all:
+        model.reset(None if reset_all else row)
+        # sliders hold their own value: drop it so they show the data again
+        for state_key in [k for k in st.session_state if k.startswith("whatif_value_")]:
+            if reset_all or state_key.startswith(f"whatif_value_{row}_"):
+                del st.session_state[state_key]
+
+    post, abs_change = model.overrides.get(
+        row, (base.at[row, "Post"], base.at[row, "Absolute Change"])
+    )
+    current = float(post if field == "Post" else abs_change)
+    # Pre may be blank for a segment: it then does not widen the range
+    span = max(
+        np.nan_to_num(abs(float(base.at[row, "Pre"]))),
+        np.nan_to_num(abs(float(base.at[row, "Post"]))),
+        1.0
+    )
+    low, high = (0.0, 2 * span) if field == "Post" else (-span, span)
+    value = st.slider(
+        f"What-if {field}",
+        min_value=min(low, current),
+        max_value=max(high, current),
+        value=current,
+        key=f"whatif_value_{row}_{field}"
+    )
+    if value != current:
+        if field == "Post":
+            model.set_segment(row, post=value)
+        else:
+            model.set_segment(row, absolute_change=value)
+
+    scenario = model.frame()
+    if not model.overrides:
+        st.caption("No overrides yet: move the slider to try a scenario.")
+        return
+
+    summary = model.section_summary()
+    changed = summary["What-If Total Change"] != summary["Actual Total Change"]
+    st.dataframe(summary[changed], use_container_width=True)
+
+    section_view = scenario.iloc[rows].copy()
+    section_view["Actual Contribution (%)"] = base.loc[
+        section_view.index, "Contribution to Absolute Change (%)"
+    ]
+    st.dataframe(
+        section_view.sort_values("RCA Priority")[[
+            "KPI Segment Label",
+            "Absolute Change",
+            "Actual Contribution (%)",
+            "Contribution to Absolute Change (%)",
+            "Combined Impact Score",
+            "RCA Priority",
+            "What-If Override",
+        ]],
+        use_container_width=True
+    )
+    st.write("What-if narrative")
+    st.text(generate_structured_rca_text(scenario, brand_name=brand_name))
 
-def build_key_column(df):
-    df = df.copy()
-    df["Key"] = df["Section"].astype(str) + " | " + df["KPI Segment Label"].astype(str)
-    return df
 
+runner = get_job_runner()
+poll_jobs = False
 
 st.title("Telecom Revenue RCA Dashboard")
 
-tab_single, tab_compare = st.tabs(["Single File RCA", "Compare Two Files"])
+tab_single, tab_compare, tab_drill = st.tabs(
+    ["Single File RCA", "Compare Two Files", "Drill-down RCA"]
+)
 
 # ---------------- SINGLE FILE RCA TAB ----------------
 
@@ -177,8 +442,8 @@ with tab_single:
     st.sidebar.header("Single File Settings")
 
     uploaded_file = st.sidebar.file_uploader(
-        "Upload Excel (MTD vs LMTD)",
-        type=["xlsx"],
+        "Upload Excel (MTD vs LMTD), or a CSV / Parquet export",
+        type=list(INPUT_FORMATS),
         key="single_uploader"
     )
 
@@ -203,53 +468,139 @@ with tab_single:
         key="single_brand"
     )
 
+    volume_sheet = st.sidebar.text_input(
+        "Volume sheet for volume / mix / rate split (optional, e.g. 'Robi Subs')",
+        value="",
+        key="single_volume_sheet"
+    )
+
+    history_files = st.sidebar.file_uploader(
+        "History workbooks, prior periods (optional, for the noise filter)",
+        type=list(INPUT_FORMATS),
+        accept_multiple_files=True,
+        key="single_history"
+    )
+    exclude_noise = st.sidebar.checkbox(
+        "Hide noisy drivers in charts and narrative",
+        value=True,
+        help="Drivers whose % Change is within their usual variation "
+             "(|z| < 2 against the history workbooks).",
+        key="single_exclude_noise"
+    )
+
+    contribution_mode_single = st.sidebar.selectbox(
+        "Contribution mode",
+        CONTRIBUTION_MODES,
+        help=CONTRIBUTION_MODE_HELP,
+        key="single_contribution_mode"
+    )
+
     run_single = st.sidebar.button("Run RCA (single file)")
 
     if run_single and uploaded_file is not None:
-        st.info("Running RCA for single file...")
-
-        file_bytes = uploaded_file.read()
-        excel_io = BytesIO(file_bytes)
+        # one section cache per brand/sheet, so a daily refresh of the same
+        # workbook only recomputes the sections that changed
+        section_caches = st.session_state.setdefault("section_caches", {})
+        cache_key = (brand_name, sheet_name)
+        if cache_key not in section_caches:
+            section_caches[cache_key] = SectionResultCache()
+
+        try:
+            job = runner.submit(
+                run_single_file_rca,
+                uploaded_file.getvalue(),
+                parse_sheet_name(sheet_name),
+                brand_name,
+                cache=section_caches[cache_key],
+                volume_sheet=parse_sheet_name(volume_sheet) if volume_sheet.strip() else None,
+                contribution_mode=contribution_mode_single,
+                history=[f.getvalue() for f in history_files or []],
+                exclude_noise=exclude_noise,
+                stages=SINGLE_FILE_STAGES
+            )
+            st.session_state["single_job_id"] = job.id
+        except JobQueueFull as exc:
+            st.warning(str(exc))
+    elif run_single and uploaded_file is None:
+        st.warning("Please upload an Excel file first for the single-file analysis.")
 
-        tables = read_multiple_tables(excel_io, sheet_name=parse_sheet_name(sheet_name))
-        rca_results = process_rca(tables)
+    single_job = runner.get(st.session_state.get("single_job_id"))
+    if show_job_status(runner, single_job, cancel_key="single_cancel"):
+        poll_jobs = True
+    elif single_job is not None and single_job.status == "done":
+        rca_table = single_job.result["rca_table"]
 
-        if rca_results.empty:
+        if rca_table is None:
             st.error("No valid RCA analysis found in this sheet.")
         else:
-            rca_results = add_kpi_label_column(rca_results)
-            os.makedirs("output", exist_ok=True)
-
-            excel_path = os.path.join("output", "rca_results_single.xlsx")
-            rca_results.to_excel(excel_path, index=False)
-
-            rca_text = generate_structured_rca_text(rca_results, brand_name=brand_name)
-            txt_path = save_rca_text(
-                rca_text,
-                output_folder="output",
-                filename="rca_insights_single.txt"
-            )
+            rca_text = single_job.result["rca_text"]
+            excel_path = single_job.result["excel_path"]
+            txt_path = single_job.result["txt_path"]
+            section_stats = single_job.result["section_stats"]
+
+            if section_stats is not None:
+                st.caption(
+                    f"Sections reused from previous run: {section_stats['reused']}, "
+                    f"recomputed: {section_stats['recomputed']}"
+                )
 
-            col1, col2 = st.columns([1, 1])
+            reconciliation = single_job.result["reconciliation"]
+            if reconciliation is None:
+                st.caption(
+                    "No brand total row found in this sheet: section totals "
+                    "were not checked against it."
+                )
+            elif reconciliation["Diverges"].any():
+                diverging = reconciliation[reconciliation["Diverges"]]
+                st.warning(
+                    "Segment sums do not match the brand total for: "
+                    + ", ".join(diverging["Section"].astype(str))
+                )
+                st.dataframe(diverging, use_container_width=True)
 
-            with col1:
-                st.subheader("RCA Narrative (Key Factors)")
-                st.text(rca_text)
+            st.subheader("RCA Narrative (Key Factors)")
+            st.text(rca_text)
 
-            with col2:
-                st.subheader("RCA Results Preview")
-                st.dataframe(rca_results.head(30), use_container_width=True)
+            st.subheader("RCA Results")
+            show_results_browser(
+                rca_table,
+                key="single_browser",
+                sort_default="Contribution to Absolute Change (%)"
+            )
 
             st.subheader("Top Revenue Drivers")
-            chart_pos, chart_neg = plot_rca_drivers(
-                rca_results,
+            chart_cols = ["KPI Segment Label", "Contribution to Absolute Change (%)"]
+            if "Noise Flag" in rca_table.column_names:
+                chart_cols.append("Noise Flag")
+                st.caption(
+                    f"{pc.sum(rca_table['Noise Flag']).as_py()} of {rca_table.num_rows} "
+                    "segments moved within their usual variation (Noise Flag)."
+                )
+            chart_df = arrow_project(rca_table, chart_cols).to_pandas()
+            top_pos, top_neg = build_driver_chart_data(
+                chart_df,
                 top_n=top_n_single,
-                output_folder="output"
+                exclude_noise=exclude_noise
             )
             st.write("Top Positive Drivers")
-            st.image(chart_pos, use_column_width=True)
+            st.altair_chart(driver_chart(top_pos, "green"), use_container_width=True)
             st.write("Top Negative Drivers")
-            st.image(chart_neg, use_column_width=True)
+            st.altair_chart(driver_chart(top_neg, "red"), use_container_width=True)
+
+            with st.expander("What-if simulator"):
+                # one model per finished run, kept across reruns with its overrides
+                whatif = st.session_state.get("whatif_model")
+                if whatif is None or whatif[0] != single_job.id:
+                    whatif = (
+                        single_job.id,
+                        WhatIfModel(
+                            rca_table.to_pandas(),
+                            single_job.result["section_totals"],
+                            single_job.result["contribution_mode"]
+                        )
+                    )
+                    st.session_state["whatif_model"] = whatif
+                show_what_if(whatif[1], brand_name)
 
             st.subheader("Downloads")
             with open(excel_path, "rb") as f:
@@ -259,6 +610,12 @@ with tab_single:
                     file_name="rca_results_single.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
+            st.download_button(
+                label="Download RCA Results (Parquet)",
+                data=arrow_to_parquet_bytes(rca_table),
+                file_name="rca_results_single.parquet",
+                mime="application/vnd.apache.parquet"
+            )
             with open(txt_path, "rb") as f:
                 st.download_button(
                     label="Download RCA Insights (Text)",
@@ -266,8 +623,22 @@ with tab_single:
                     file_name="rca_insights_single.txt",
                     mime="text/plain"
                 )
-    elif run_single and uploaded_file is None:
-        st.warning("Please upload an Excel file first for the single-file analysis.")
+            # PNGs are only rendered on request, for reports
+            if st.button("Export charts as PNG", key="single_png_export"):
+                chart_pos, chart_neg = plot_rca_drivers(
+                    chart_df,
+                    top_n=top_n_single,
+                    output_folder="output",
+                    exclude_noise=exclude_noise
+                )
+                for label, path in [("positive", chart_pos), ("negative", chart_neg)]:
+                    with open(path, "rb") as f:
+                        st.download_button(
+                            label=f"Download top {label} drivers chart (PNG)",
+                            data=f,
+                            file_name=os.path.basename(path),
+                            mime="image/png"
+                        )
 
 
 # ---------------- COMPARE TWO FILES TAB ----------------
@@ -418,7 +789,7 @@ with tab_compare:
 
     uploaded_file_a = st.sidebar.file_uploader(
         "Upload Excel A",
-        type=["xlsx"],
+        type=list(INPUT_FORMATS),
         key="cmp_uploader_a"
     )
     sheet_a = st.sidebar.text_input(
@@ -434,7 +805,7 @@ with tab_compare:
 
     uploaded_file_b = st.sidebar.file_uploader(
         "Upload Excel B",
-        type=["xlsx"],
+        type=list(INPUT_FORMATS),
         key="cmp_uploader_b"
     )
     sheet_b = st.sidebar.text_input(
@@ -457,146 +828,271 @@ with tab_compare:
         key="cmp_topn"
     )
 
+    contribution_mode_cmp = st.sidebar.selectbox(
+        "Contribution mode",
+        CONTRIBUTION_MODES,
+        help=CONTRIBUTION_MODE_HELP,
+        key="cmp_contribution_mode"
+    )
+
     run_compare = st.sidebar.button("Run RCA Comparison")
 
     if run_compare:
         if uploaded_file_a is None or uploaded_file_b is None:
             st.warning("Please upload both Excel files for comparison.")
         else:
-            st.info("Running RCA on both files and building comparison...")
-
-            # --- File A ---
-            bytes_a = uploaded_file_a.read()
-            excel_io_a = BytesIO(bytes_a)
-            tables_a = read_multiple_tables(
-                excel_io_a,
-                sheet_name=parse_sheet_name(sheet_a)
-            )
-            rca_a = process_rca(tables_a)
-
-            # --- File B ---
-            bytes_b = uploaded_file_b.read()
-            excel_io_b = BytesIO(bytes_b)
-            tables_b = read_multiple_tables(
-                excel_io_b,
-                sheet_name=parse_sheet_name(sheet_b)
+            try:
+                job = runner.submit(
+                    run_compare_rca,
+                    uploaded_file_a.getvalue(),
+                    parse_sheet_name(sheet_a),
+                    uploaded_file_b.getvalue(),
+                    parse_sheet_name(sheet_b),
+                    result_cache=get_result_cache(),
+                    contribution_mode=contribution_mode_cmp,
+                    stages=COMPARE_STAGES
+                )
+                st.session_state["cmp_job_id"] = job.id
+            except JobQueueFull as exc:
+                st.warning(str(exc))
+
+    cmp_job = runner.get(st.session_state.get("cmp_job_id"))
+    if show_job_status(runner, cmp_job, cancel_key="cmp_cancel"):
+        poll_jobs = True
+    elif cmp_job is not None and cmp_job.status == "done":
+        comparison = cmp_job.result
+
+        if comparison is None:
+            st.error("RCA results were empty for one or both files.")
+        else:
+            # biggest movers either way; only these rows leave Arrow
+            cmp_top = arrow_top_k(
+                comparison,
+                "Delta_ContribAbs",
+                top_n_cmp,
+                absolute=True
+            ).to_pandas()
+
+            # ---------- TABLE WITH GREEN HIGHER VALUE PER BRAND ----------
+            st.subheader("Top segments where contribution changed most")
+
+            # Rename contribution columns to show brand names
+            disp = cmp_top
+            col_a = f"ContribAbs_{brand_a}"
+            col_b = f"ContribAbs_{brand_b}"
+            disp = disp.rename(
+                columns={
+                    "ContribAbs_A": col_a,
+                    "ContribAbs_B": col_b,
+                }
             )
-            rca_b = process_rca(tables_b)
-
-            if rca_a.empty or rca_b.empty:
-                st.error("RCA results were empty for one or both files.")
-            else:
-                rca_a = add_kpi_label_column(rca_a)
-                rca_b = add_kpi_label_column(rca_b)
 
-                rca_a["Key"] = rca_a["Section"].astype(str) + " | " + rca_a["KPI Segment Label"].astype(str)
-                rca_b["Key"] = rca_b["Section"].astype(str) + " | " + rca_b["KPI Segment Label"].astype(str)
+            # Style: make higher contribution (per row) green
+            styler = disp.style.apply(
+                higher_value_styles,
+                axis=None,
+                col_a=col_a,
+                col_b=col_b
+            )
 
-                cols_core = [
-                    "Key",
-                    "Section",
-                    "KPI Segment Label",
-                    "Absolute Change",
-                    "Contribution to Absolute Change (%)",
-                    "Contribution to Post (%)"
-                ]
-
-                df_a = rca_a[cols_core].copy()
-                df_b = rca_b[cols_core].copy()
-
-                df_a = df_a.rename(
-                    columns={
-                        "Absolute Change": "AbsChange_A",
-                        "Contribution to Absolute Change (%)": "ContribAbs_A",
-                        "Contribution to Post (%)": "ContribPost_A",
-                    }
-                )
-                df_b = df_b.rename(
-                    columns={
-                        "Absolute Change": "AbsChange_B",
-                        "Contribution to Absolute Change (%)": "ContribAbs_B",
-                        "Contribution to Post (%)": "ContribPost_B",
-                    }
+            st.dataframe(styler, use_container_width=True)
+
+            with st.expander("Browse full comparison"):
+                show_results_browser(
+                    comparison,
+                    key="cmp_browser",
+                    sort_default="Delta_ContribAbs",
+                    style=lambda df: df.style.apply(
+                        higher_value_styles,
+                        axis=None,
+                        col_a="ContribAbs_A",
+                        col_b="ContribAbs_B"
+                    )
                 )
 
-                cmp_df = pd.merge(
-                    df_a,
-                    df_b,
-                    on=["Key", "Section", "KPI Segment Label"],
-                    how="outer"
+            # ---------- TEXTUAL INSIGHTS WITH BRAND NAMES ----------
+            st.subheader("Key comparison insights (top segments)")
+            lines = []
+            for _, row in cmp_top.iterrows():
+                label = row["KPI Segment Label"]
+                contrib_a = row["ContribAbs_A"] if pd.notna(row["ContribAbs_A"]) else 0
+                contrib_b = row["ContribAbs_B"] if pd.notna(row["ContribAbs_B"]) else 0
+                d_abs = row["Delta_AbsChange"]
+                d_contrib = row["Delta_ContribAbs"]
+                lines.append(
+                    f"{label}: "
+                    f"{brand_a} Contrib={contrib_a:+.2f}%, "
+                    f"{brand_b} Contrib={contrib_b:+.2f}%, "
+                    f"ΔAbsChange={d_abs:+,.0f}, ΔContribution={d_contrib:+.2f} pts"
                 )
+            st.text("\n".join(lines))
 
-                cmp_df["Delta_AbsChange"] = cmp_df["AbsChange_A"].fillna(0) - cmp_df["AbsChange_B"].fillna(0)
-                cmp_df["Delta_ContribAbs"] = cmp_df["ContribAbs_A"].fillna(0) - cmp_df["ContribAbs_B"].fillna(0)
-                cmp_df["Delta_ContribPost"] = cmp_df["ContribPost_A"].fillna(0) - cmp_df["ContribPost_B"].fillna(0)
+            # ---------- DOWNLOAD FULL COMPARISON ----------
+            os.makedirs("output", exist_ok=True)
+            cmp_path = os.path.join("output", "rca_comparison.xlsx")
+            cmp_sorted = arrow_top_k(
+                comparison,
+                "Delta_ContribAbs",
+                comparison.num_rows,
+                absolute=True
+            )
+            cmp_sorted.to_pandas().to_excel(cmp_path, index=False)
 
-                cmp_sorted = cmp_df.sort_values(
-                    "Delta_ContribAbs",
-                    key=lambda s: s.abs(),
-                    ascending=False
+            with open(cmp_path, "rb") as f:
+                st.download_button(
+                    label="Download full comparison (Excel)",
+                    data=f,
+                    file_name="rca_comparison.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
+            st.download_button(
+                label="Download full comparison (Parquet)",
+                data=arrow_to_parquet_bytes(cmp_sorted),
+                file_name="rca_comparison.parquet",
+                mime="application/vnd.apache.parquet"
+            )
 
-                # ---------- TABLE WITH GREEN HIGHER VALUE PER BRAND ----------
-                st.subheader("Top segments where contribution changed most")
-
-                # Rename contribution columns to show brand names
-                disp = cmp_sorted.head(top_n_cmp).copy()
-                col_a = f"ContribAbs_{brand_a}"
-                col_b = f"ContribAbs_{brand_b}"
-                disp = disp.rename(
-                    columns={
-                        "ContribAbs_A": col_a,
-                        "ContribAbs_B": col_b,
-                    }
-                )
 
-                # Style: make higher contribution (per row) green
-                def highlight_higher(row):
-                    a = row[col_a]
-                    b = row[col_b]
-                    styles = []
-                    for col in row.index:
-                        if col == col_a:
-                            styles.append("color: green" if a >= b else "")
-                        elif col == col_b:
-                            styles.append("color: green" if b > a else "")
-                        else:
-                            styles.append("")
-                    return styles
-
-                styler = disp.style.apply(
-                    highlight_higher,
-                    axis=1
+# ---------------- DRILL-DOWN RCA TAB ----------------
+
+with tab_drill:
+    st.sidebar.header("Drill-down Settings")
+
+    uploaded_long = st.sidebar.file_uploader(
+        "Upload long Excel (dimension columns + Pre / Post)",
+        type=list(INPUT_FORMATS),
+        key="drill_uploader"
+    )
+    sheet_long = st.sidebar.text_input(
+        "Sheet for drill-down (index or name)",
+        value="0",
+        key="drill_sheet"
+    )
+
+    if uploaded_long is None:
+        st.info(
+            "Upload a long sheet with one row per segment cell: one column per "
+            "dimension (e.g. Clustername, Handset Type, Arpu Segment) plus Pre and Post."
+        )
+    else:
+        long_bytes = uploaded_long.getvalue()
+        long_sheet = parse_sheet_name(sheet_long)
+        long_digest = workbook_digest(long_bytes, long_sheet)
+        try:
+            long_table, dims = get_long_table(long_digest, long_bytes, long_sheet)
+        except (ValueError, KeyError) as exc:
+            st.error(f"Could not read drill-down sheet: {exc}")
+            dims = []
+
+        hierarchy = st.multiselect(
+            "Hierarchy (in drill-down order)",
+            dims,
+            default=dims[:3],
+            key="drill_hierarchy"
+        )
+
+        if hierarchy:
+            model = get_hierarchy_model(long_digest, tuple(hierarchy), long_table)
+            show_cols = [
+                "Path",
+                "Pre",
+                "Post",
+                "Absolute Change",
+                "Contribution to Absolute Change (%)",
+                "Contribution to Parent Change (%)",
+                "RCA Priority",
+            ]
+
+            st.subheader("Biggest driver chain")
+            st.dataframe(
+                model.drill_down()[show_cols],
+                use_container_width=True
+            )
+
+            # expand one node per level, only along the chosen path
+            path = ()
+            for depth, dim in enumerate(hierarchy, start=1):
+                children = model.children(path)
+                rows = select_top_k(
+                    children,
+                    "Absolute Change",
+                    k=len(children),
+                    absolute=True
+                )
+                st.subheader(f"Level {depth}: {dim}")
+                st.dataframe(rows[show_cols], use_container_width=True)
+
+                if depth == len(hierarchy):
+                    break
+                choice = st.selectbox(
+                    f"Drill into {dim}",
+                    ["(none)"] + rows[dim].astype(str).tolist(),
+                    key=f"drill_{depth}_{'|'.join(path)}"
                 )
+                if choice == "(none)":
+                    break
+                path = path + (choice,)
+
+        if dims:
+            st.subheader("Automatic driver search")
+            st.caption(
+                "Searches single dimensions and their combinations for the "
+                "slices that explain the most Absolute Change."
+            )
+            s1, s2, s3 = st.columns([2, 1, 1])
+            search_dims = s1.multiselect(
+                "Dimensions to combine",
+                dims,
+                default=dims,
+                key="search_dims"
+            )
+            max_order = s2.slider(
+                "Max dimensions per slice",
+                min_value=1,
+                max_value=3,
+                value=2,
+                key="search_order"
+            )
+            min_contribution = s3.number_input(
+                "Min contribution (%)",
+                min_value=0.1,
+                max_value=100.0,
+                value=5.0,
+                step=0.5,
+                key="search_min_contrib"
+            )
 
-                st.dataframe(styler, use_container_width=True)
-
-                # ---------- TEXTUAL INSIGHTS WITH BRAND NAMES ----------
-                st.subheader("Key comparison insights (top segments)")
-                lines = []
-                for _, row in cmp_sorted.head(top_n_cmp).iterrows():
-                    label = row["KPI Segment Label"]
-                    contrib_a = row["ContribAbs_A"] if pd.notna(row["ContribAbs_A"]) else 0
-                    contrib_b = row["ContribAbs_B"] if pd.notna(row["ContribAbs_B"]) else 0
-                    d_abs = row["Delta_AbsChange"]
-                    d_contrib = row["Delta_ContribAbs"]
-                    lines.append(
-                        f"{label}: "
-                        f"{brand_a} Contrib={contrib_a:+.2f}%, "
-                        f"{brand_b} Contrib={contrib_b:+.2f}%, "
-                        f"ΔAbsChange={d_abs:+,.0f}, ΔContribution={d_contrib:+.2f} pts"
-                    )
-                st.text("\n".join(lines))
-
-                # ---------- DOWNLOAD FULL COMPARISON ----------
-                os.makedirs("output", exist_ok=True)
-                cmp_path = os.path.join("output", "rca_comparison.xlsx")
-                cmp_sorted.to_excel(cmp_path, index=False)
-
-                with open(cmp_path, "rb") as f:
-                    st.download_button(
-                        label="Download full comparison (Excel)",
-                        data=f,
-                        file_name="rca_comparison.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            if search_dims:
+                combos = get_driver_combinations(
+                    long_digest,
+                    tuple(search_dims),
+                    max_order,
+                    min_contribution,
+                    long_table
+                )
+                if combos.empty:
+                    st.info("No slice explains at least the minimum contribution.")
+                else:
+                    st.text(generate_combination_rca_text(combos, brand_name=brand_name))
+                    st.dataframe(
+                        add_kpi_label_column(combos)[[
+                            "KPI Segment Label",
+                            "Order",
+                            "Pre",
+                            "Post",
+                            "Absolute Change",
+                            "Contribution to Absolute Change (%)",
+                            "Surprise",
+                            "RCA Priority",
+                        ]],
+                        use_container_width=True
                     )
+
+
+# ---------------- BACKGROUND JOB POLLING ----------------
+
+# Rerun while any job of this session is still working, so the progress
+# bars above keep moving. Done last so both tabs render on every pass.
+if poll_jobs:
+    time.sleep(0.5)
+    st.rerun()
@@ -0,0 +1,53 @@
+"""
+Timing of the multi-dimensional driver search on synthetic long data.
+
+    python benchmarks/bench_driver_search.py --rows 2000000 --max-order 3
+
+Prints the search time per max order, the number of explaining slices and
+the top few, plus the drill-down model build time for comparison.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rca_agent_new import add_kpi_label_column  # noqa: E402
+from rca_hierarchy import (  # noqa: E402
+    HierarchicalRca,
+    prepare_long_table,
+    search_driver_combinations,
+)
+from synthetic import make_long_table  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Driver search benchmark.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--max-order", type=int, default=3)
+    parser.add_argument("--min-contribution", type=float, default=5.0)
+    args = parser.parse_args()
+
+    df, dims = prepare_long_table(make_long_table(args.rows))
+    print(f"rows {len(df):,} | dimensions {', '.join(dims)}")
+
+    start = time.perf_counter()
+    model = HierarchicalRca(df, dims[:3])
+    model.drill_down()
+    print(f"drill-down model + driver chain: {time.perf_counter() - start:6.2f} s")
+
+    for order in range(1, args.max_order + 1):
+        start = time.perf_counter()
+        combos = search_driver_combinations(
+            df, dims, max_order=order, min_contribution=args.min_contribution
+        )
+        elapsed = time.perf_counter() - start
+        print(f"search up to {order} dims: {elapsed:6.2f} s | {len(combos)} slices")
+
+    top = add_kpi_label_column(combos).head(5)
+    print(top[["KPI Segment Label", "Contribution to Absolute Change (%)"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
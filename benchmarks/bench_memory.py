@@ -0,0 +1,176 @@
+"""
+Peak memory and copy counts of the post-RCA stages, legacy pandas handoff
+vs the Arrow handoff used by the dashboard.
+
+    python benchmarks/bench_memory.py --sections 20 --segments 5000
+
+Stages measured (same inputs for both paths): KPI labels, chart data,
+comparison of two results, results preview as the UI serialises it.
+Copies are counted as deep DataFrame.copy() calls plus pandas -> Arrow
+conversions.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rca_agent_new import (  # noqa: E402
+    process_rca,
+    add_kpi_label_column,
+    rca_to_arrow,
+    arrow_project,
+    arrow_top_k,
+    compare_rca_tables,
+)
+from synthetic import make_tables  # noqa: E402
+
+
+COUNTS = {"deep_copies": 0, "to_arrow": 0}
+
+
+def _count_copies():
+    original_copy = pd.DataFrame.copy
+
+    def counting_copy(self, deep=True):
+        if deep:
+            COUNTS["deep_copies"] += 1
+        return original_copy(self, deep=deep)
+
+    pd.DataFrame.copy = counting_copy
+
+
+def to_arrow(df, convert=pa.Table.from_pandas):
+    COUNTS["to_arrow"] += 1
+    return convert(df)
+
+
+def legacy_flow(rca_a, rca_b, top_n=10):
+    """
+    The pre-Arrow handoff: label with a copy + row-wise apply, copy again
+    for charts, copy + rename both sides for the comparison, and let the
+    UI convert the two previews to Arrow, as the original app did.
+    """
+    def label(df):
+        df = df.copy()
+        df["KPI Segment Label"] = df.apply(
+            lambda row: f"{row['Section']}: {row.get(row['Section'], None)}", axis=1
+        )
+        return df
+
+    rca_a, rca_b = label(rca_a), label(rca_b)
+
+    df_plot = rca_a.copy()
+    df_plot["Contrib_for_chart"] = df_plot["Contribution to Absolute Change (%)"]
+    df_plot.sort_values("Contrib_for_chart", ascending=False).head(top_n)
+
+    cols_core = [
+        "Key",
+        "Section",
+        "KPI Segment Label",
+        "Absolute Change",
+        "Contribution to Absolute Change (%)",
+        "Contribution to Post (%)",
+    ]
+    sides = []
+    for df, suffix in ((rca_a, "A"), (rca_b, "B")):
+        df["Key"] = df["Section"].astype(str) + " | " + df["KPI Segment Label"].astype(str)
+        side = df[cols_core].copy().rename(columns={
+            "Absolute Change": f"AbsChange_{suffix}",
+            "Contribution to Absolute Change (%)": f"ContribAbs_{suffix}",
+            "Contribution to Post (%)": f"ContribPost_{suffix}",
+        })
+        sides.append(side)
+    cmp_df = pd.merge(*sides, on=["Key", "Section", "KPI Segment Label"], how="outer")
+    cmp_df["Delta_ContribAbs"] = (
+        cmp_df["ContribAbs_A"].fillna(0) - cmp_df["ContribAbs_B"].fillna(0)
+    )
+    cmp_sorted = cmp_df.sort_values(
+        "Delta_ContribAbs", key=lambda s: s.abs(), ascending=False
+    )
+
+    # st.dataframe converts what it is given to Arrow: the original app
+    # showed the first 30 result rows and the top comparison rows
+    to_arrow(rca_a.head(30))
+    to_arrow(cmp_sorted.head(top_n))
+
+
+def arrow_flow(rca_a, rca_b, top_n=10):
+    """
+    The Arrow handoff: shallow-copy labels, one conversion per result,
+    projections / slices / takes for everything downstream.
+    """
+    table_a = to_arrow(add_kpi_label_column(rca_a), rca_to_arrow)
+    table_b = to_arrow(add_kpi_label_column(rca_b), rca_to_arrow)
+
+    chart = arrow_project(
+        table_a, ["KPI Segment Label", "Contribution to Absolute Change (%)"]
+    )
+    arrow_top_k(chart, "Contribution to Absolute Change (%)", top_n)
+
+    comparison = compare_rca_tables(table_a, table_b)
+    arrow_top_k(comparison, "Delta_ContribAbs", top_n, absolute=True)
+
+    table_a.slice(0, 30)
+
+
+def measure(name, sections, segments):
+    """
+    Run one flow in this (fresh) process: a timed run (also giving the Arrow
+    pool high-water mark), then a run under tracemalloc for peak
+    Python/numpy memory and copy counts.
+    """
+    rca_a = process_rca(make_tables(sections, segments, seed=1))
+    rca_b = process_rca(make_tables(sections, segments, seed=2))
+    flow = FLOWS[name]
+    _count_copies()
+
+    pool = pa.default_memory_pool()
+    arrow_before = pool.max_memory()
+    start = time.perf_counter()
+    flow(rca_a, rca_b)
+    elapsed = time.perf_counter() - start
+    arrow_peak = max(pool.max_memory() - arrow_before, 0)
+
+    COUNTS.update(deep_copies=0, to_arrow=0)
+    tracemalloc.start()
+    flow(rca_a, rca_b)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return name, len(rca_a), elapsed, peak, arrow_peak, dict(COUNTS)
+
+
+FLOWS = {"legacy": legacy_flow, "arrow": arrow_flow}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory / copy benchmark.")
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--segments", type=int, default=5000)
+    args = parser.parse_args()
+
+    # each flow in its own process so allocator high-water marks are not shared
+    ctx = multiprocessing.get_context("spawn")
+    for name in FLOWS:
+        with ctx.Pool(1) as pool:
+            name, rows, elapsed, peak, arrow_peak, counts = pool.apply(
+                measure, (name, args.sections, args.segments)
+            )
+        print(
+            f"{name:<7} rows {rows:,} | time {elapsed:6.2f} s "
+            f"| peak python/numpy {peak / 2**20:7.1f} MiB "
+            f"| arrow pool {arrow_peak / 2**20:7.1f} MiB "
+            f"| deep copies {counts['deep_copies']:2d} "
+            f"| pandas->arrow {counts['to_arrow']:2d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
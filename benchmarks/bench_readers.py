@@ -0,0 +1,141 @@
+"""
+Load time of each input reader on the same large sheet.
+
+    python benchmarks/bench_readers.py --sections 20 --segments 2000
+
+Writes one synthetic sheet as xlsx, CSV and Parquet, then times
+read_multiple_tables on each (xlsx with openpyxl and, when installed,
+calamine), plus the old row-by-row blank-row splitter against the
+vectorized one on the same in-memory sheet.
+
+With --sheets N it also writes an N-sheet workbook and times reading every
+sheet with one read_multiple_tables(path, sheet) call each (one workbook
+open per sheet) against a single WorkbookSession.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rca_agent_new import (  # noqa: E402
+    WorkbookSession,
+    excel_engine,
+    load_sheet,
+    process_rca,
+    read_multiple_tables,
+    split_sections,
+)
+from synthetic import make_sheet, write_workbook  # noqa: E402
+
+
+def split_sections_iterrows(df):
+    # the original splitter, kept here for comparison
+    tables, current_table = [], []
+    for _, row in df.iterrows():
+        if row.isnull().all():
+            if current_table:
+                tables.append(pd.DataFrame(current_table).reset_index(drop=True))
+                current_table = []
+        else:
+            current_table.append(row)
+    if current_table:
+        tables.append(pd.DataFrame(current_table).reset_index(drop=True))
+    return tables
+
+
+def timed(func, *args, repeat=3, **kwargs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Input reader benchmark.")
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--segments", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sheets", type=int, default=0)
+    args = parser.parse_args()
+
+    sheet = make_sheet("Brand 1", args.sections, args.segments)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {
+            "xlsx": os.path.join(tmp, "sheet.xlsx"),
+            "csv": os.path.join(tmp, "sheet.csv"),
+            "parquet": os.path.join(tmp, "sheet.parquet"),
+        }
+        sheet.to_excel(paths["xlsx"], header=False, index=False)
+        sheet.to_csv(paths["csv"], header=False, index=False)
+        # Parquet needs one type per column: store the raw cells as text
+        sheet.astype(str).where(sheet.notna(), None).rename(columns=str).to_parquet(
+            paths["parquet"]
+        )
+
+        print(f"sheet: {sheet.shape[0]:,} rows x {sheet.shape[1]} columns")
+        runs = [("xlsx (openpyxl)", paths["xlsx"], {"engine": "openpyxl"})]
+        if excel_engine() == "calamine":
+            runs.append(("xlsx (calamine)", paths["xlsx"], {"engine": "calamine"}))
+        else:
+            print("python-calamine not installed: skipping the calamine reader")
+        runs += [("csv", paths["csv"], {}), ("parquet", paths["parquet"], {})]
+
+        n_segments = None
+        for name, path, opts in runs:
+            if "engine" in opts:
+                elapsed, raw = timed(
+                    pd.read_excel, path, header=None, repeat=args.repeat, **opts
+                )
+            else:
+                elapsed, raw = timed(load_sheet, path, repeat=args.repeat)
+            rows = len(process_rca(split_sections(raw)))
+            n_segments = n_segments or rows
+            check = "ok" if rows == n_segments else f"MISMATCH ({rows} rows)"
+            print(f"{name:<16} load {elapsed:7.3f} s | RCA rows {rows:,} {check}")
+
+    loop_time, _ = timed(split_sections_iterrows, sheet, repeat=args.repeat)
+    fast_time, _ = timed(split_sections, sheet, repeat=args.repeat)
+    print(f"section split: iterrows {loop_time:.3f} s | vectorized {fast_time:.3f} s")
+
+    if args.sheets:
+        bench_sessions(args)
+
+
+def read_per_sheet(path, sheet_names):
+    return [read_multiple_tables(path, sheet_name=name) for name in sheet_names]
+
+
+def read_with_session(path, sheet_names):
+    with WorkbookSession(path) as session:
+        return [tables for _, tables in session.iter_tables(sheet_names)]
+
+
+def bench_sessions(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_workbook(
+            os.path.join(tmp, "book.xlsx"), args.sheets, args.sections, args.segments
+        )
+        sheet_names = [f"Brand {b + 1}" for b in range(args.sheets)]
+        per_sheet, tables_a = timed(read_per_sheet, path, sheet_names, repeat=args.repeat)
+        session, tables_b = timed(read_with_session, path, sheet_names, repeat=args.repeat)
+
+    same = all(
+        len(a) == len(b) and all(x.equals(y) for x, y in zip(a, b))
+        for a, b in zip(tables_a, tables_b)
+    )
+    print(
+        f"{args.sheets} sheets: one open per sheet {per_sheet:.3f} s | "
+        f"one session {session:.3f} s | tables {'identical' if same else 'DIFFER'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Differential check of RCA engines against the reference implementation.
+
+    python benchmarks/differential.py
+    python benchmarks/differential.py --sheets 3 --sections 12 --segments 2000
+
+Every registered engine runs the same pipeline (read the sheet's tables,
+process_rca, label, narrative) on sample.xlsx, Sample_Airtel.xlsx and
+synthetic workbooks, and is compared with the "reference" engine
+(benchmarks/reference_rca.py, the original code):
+
+- tables: same count, same cells;
+- RCA frame: every reference column present, values equal within
+  --rtol / --atol (extra columns are allowed);
+- narrative: identical text.
+
+Prints timings and the speedup over the reference, and exits with status 1
+if any engine differs, so it can gate performance changes. To check a new
+fast path, register it before calling main():
+
+    import differential
+    differential.register_engine("my engine", read_tables=..., process=...)
+    differential.main()
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+import rca_agent_new  # noqa: E402
+import reference_rca  # noqa: E402
+from synthetic import write_workbook  # noqa: E402
+
+
+SAMPLE_WORKBOOKS = ["sample.xlsx", "Sample_Airtel.xlsx"]
+STAGES = ["read", "rca", "label", "narrative"]
+
+ENGINES = {}
+
+
+def register_engine(name, read_tables=None, process=None, label=None, narrative=None):
+    """
+    Add an engine to the check. Each stage defaults to the current
+    rca_agent_new function, so an engine only names what it replaces:
+    read_tables(path, sheet_name), process(tables), label(rca_df),
+    narrative(rca_df, brand_name).
+    """
+    ENGINES[name] = {
+        "read": read_tables or rca_agent_new.read_multiple_tables,
+        "rca": process or rca_agent_new.process_rca,
+        "label": label or rca_agent_new.add_kpi_label_column,
+        "narrative": narrative or (
+            lambda rca_df, brand_name: rca_agent_new.generate_structured_rca_text(
+                rca_df, brand_name=brand_name
+            )
+        ),
+    }
+
+
+register_engine(
+    "reference",
+    read_tables=reference_rca.read_multiple_tables,
+    process=reference_rca.process_rca,
+    label=reference_rca.add_kpi_label_column,
+    narrative=lambda rca_df, brand_name: reference_rca.generate_structured_rca_text(
+        rca_df, brand_name=brand_name
+    ),
+)
+register_engine("current")
+
+
+# -------------- RUN & COMPARE --------------
+
+
+def run_engine(engine, path, sheet_name, brand_name):
+    """
+    Run one engine on one sheet. Returns (outputs, seconds per stage).
+    """
+    outputs, timings = {}, {}
+
+    start = time.perf_counter()
+    tables = engine["read"](path, sheet_name)
+    timings["read"] = time.perf_counter() - start
+    # the reference process_rca renames columns of the tables it is given
+    outputs["tables"] = [table.copy() for table in tables]
+
+    start = time.perf_counter()
+    rca_df = engine["rca"](tables)
+    timings["rca"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labelled = engine["label"](rca_df) if not rca_df.empty else rca_df
+    timings["label"] = time.perf_counter() - start
+    outputs["rca"] = labelled
+
+    start = time.perf_counter()
+    outputs["narrative"] = (
+        engine["narrative"](labelled, brand_name) if not labelled.empty else ""
+    )
+    timings["narrative"] = time.perf_counter() - start
+    return outputs, timings
+
+
+def _first_difference(text_a, text_b):
+    lines_a, lines_b = text_a.splitlines(), text_b.splitlines()
+    for n, (a, b) in enumerate(zip(lines_a, lines_b)):
+        if a != b:
+            return f"line {n + 1}: {a!r} != {b!r}"
+    return f"{len(lines_a)} vs {len(lines_b)} lines"
+
+
+def compare_outputs(reference, candidate, rtol=1e-9, atol=1e-9):
+    """
+    List of differences between two run_engine outputs (empty if they match).
+    """
+    problems = []
+
+    ref_tables, tables = reference["tables"], candidate["tables"]
+    if len(ref_tables) != len(tables):
+        problems.append(f"tables: {len(tables)} vs {len(ref_tables)} in the reference")
+    else:
+        for n, (ref_table, table) in enumerate(zip(ref_tables, tables)):
+            try:
+                pd.testing.assert_frame_equal(
+                    table.reset_index(drop=True).astype(object),
+                    ref_table.reset_index(drop=True).astype(object),
+                    check_dtype=False,
+                    check_names=False,
+                    check_column_type=False,
+                )
+            except AssertionError as exc:
+                problems.append(f"table {n}: {str(exc).splitlines()[0]}")
+
+    ref_rca, rca_df = reference["rca"], candidate["rca"]
+    missing = [col for col in ref_rca.columns if col not in rca_df.columns]
+    if missing:
+        problems.append(f"RCA columns missing: {missing}")
+    else:
+        try:
+            pd.testing.assert_frame_equal(
+                rca_df[list(ref_rca.columns)].reset_index(drop=True),
+                ref_rca.reset_index(drop=True),
+                check_dtype=False,
+                check_names=False,
+                check_column_type=False,
+                check_exact=False,
+                rtol=rtol,
+                atol=atol,
+            )
+        except AssertionError as exc:
+            message = " ".join(str(exc).split()).split(" [index]")[0]
+            problems.append("RCA frame: " + message)
+
+    if candidate["narrative"] != reference["narrative"]:
+        problems.append(
+            "narrative: " + _first_difference(candidate["narrative"], reference["narrative"])
+        )
+    return problems
+
+
+def check_dataset(name, path, sheet_name, brand_name, rtol, atol):
+    """
+    Run every engine on one sheet. Returns (report rows, problem lines).
+    """
+    runs = {
+        engine_name: run_engine(engine, path, sheet_name, brand_name)
+        for engine_name, engine in ENGINES.items()
+    }
+    reference, ref_timings = runs["reference"]
+    ref_total = sum(ref_timings.values())
+
+    rows, problems = [], []
+    for engine_name, (outputs, timings) in runs.items():
+        diffs = [] if engine_name == "reference" else compare_outputs(
+            reference, outputs, rtol, atol
+        )
+        total = sum(timings.values())
+        rows.append({
+            "dataset": name,
+            "engine": engine_name,
+            **{f"{stage} s": round(timings[stage], 3) for stage in STAGES},
+            "total s": round(total, 3),
+            "speedup": round(ref_total / total, 1) if total else float("inf"),
+            "status": "reference" if engine_name == "reference" else (
+                "identical" if not diffs else "DIFFERS"
+            ),
+        })
+        problems += [f"{name} / {engine_name}: {diff}" for diff in diffs]
+    return rows, problems
+
+
+def datasets(tmp, args):
+    """
+    (name, path, sheet, brand) for every sheet to check.
+    """
+    for workbook in SAMPLE_WORKBOOKS:
+        path = os.path.join(ROOT, workbook)
+        if not os.path.exists(path):
+            print(f"{workbook} not found, skipped")
+            continue
+        for sheet_name in pd.ExcelFile(path).sheet_names:
+            yield f"{workbook} [{sheet_name}]", path, sheet_name, sheet_name
+
+    # narrative section names, so the text comparison is not trivially empty
+    path = write_workbook(
+        os.path.join(tmp, "synthetic.xlsx"),
+        n_sheets=args.sheets,
+        n_sections=args.sections,
+        n_segments=args.segments,
+        seed=args.seed,
+        section_names=rca_agent_new.NARRATIVE_SECTIONS,
+        totals_rows=True,
+    )
+    for b in range(args.sheets):
+        brand = f"Brand {b + 1}"
+        yield f"synthetic [{brand}]", path, brand, brand
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check RCA engines against the reference.")
+    parser.add_argument("--sheets", type=int, default=2)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--segments", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rtol", type=float, default=1e-9)
+    parser.add_argument("--atol", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    rows, problems = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, path, sheet_name, brand in datasets(tmp, args):
+            dataset_rows, dataset_problems = check_dataset(
+                name, path, sheet_name, brand, args.rtol, args.atol
+            )
+            rows += dataset_rows
+            problems += dataset_problems
+
+    print(pd.DataFrame(rows).to_string(index=False))
+    if problems:
+        print("\nDifferences:")
+        for problem in problems:
+            print("-", problem)
+        sys.exit(1)
+    print("\nAll engines match the reference.")
+
+
+if __name__ == "__main__":
+    main()
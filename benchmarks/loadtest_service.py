@@ -0,0 +1,106 @@
+"""
+Load test for the local RCA HTTP service (rca_service.py).
+
+Start the service first:
+    uvicorn rca_service:app --port 8000
+
+then, from the repo root:
+    python benchmarks/loadtest_service.py --file sample.xlsx --requests 200 --concurrency 8
+
+Reports requests per second and latency percentiles. Use --no-cache to
+measure the full RCA path instead of cached responses.
+"""
+import argparse
+import os
+import statistics
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_multipart(file_path, fields):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode("utf-8")
+        )
+    with open(file_path, "rb") as f:
+        file_bytes = f.read()
+    parts.append(
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; '
+        f'filename="{os.path.basename(file_path)}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode("utf-8")
+        + file_bytes
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/rca")
+    parser.add_argument("--file", default="sample.xlsx")
+    parser.add_argument("--sheet", default="0")
+    parser.add_argument("--format", default="json", choices=["json", "parquet", "arrow"])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    body, content_type = build_multipart(
+        args.file,
+        {
+            "sheet": args.sheet,
+            "format": args.format,
+            "use_cache": "false" if args.no_cache else "true",
+        },
+    )
+
+    def one_request(_):
+        req = urllib.request.Request(
+            args.url,
+            data=body,
+            headers={"Content-Type": content_type},
+            method="POST",
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as resp:
+                resp.read()
+                ok = resp.status == 200
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [lat * 1000 for lat, ok in results if ok]
+    errors = sum(1 for _, ok in results if not ok)
+
+    print(f"requests:     {args.requests} ({errors} errors)")
+    print(f"concurrency:  {args.concurrency}")
+    print(f"elapsed:      {elapsed:.2f} s")
+    print(f"throughput:   {args.requests / elapsed:.1f} req/s")
+    if latencies:
+        print(f"latency p50:  {statistics.median(latencies):.1f} ms")
+        print(f"latency p95:  {percentile(latencies, 95):.1f} ms")
+        print(f"latency max:  {max(latencies):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Reference RCA path: read_multiple_tables, process_rca, add_kpi_label_column
+and generate_structured_rca_text exactly as first written (row-by-row
+splitting, per-table totals lookup, apply-based labels and ranking).
+
+Slow, but it pins today's outputs: benchmarks/differential.py checks every
+faster engine against it. Do not optimise this file.
+"""
+import pandas as pd
+
+
+# -------------- DATA LOADING & PREP --------------
+
+
+def read_multiple_tables(file_path, sheet_name=0):
+    """
+    Split a sheet into multiple logical tables using blank rows as separators.
+    """
+    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+    tables, current_table = [], []
+    for _, row in df.iterrows():
+        if row.isnull().all():
+            if current_table:
+                tables.append(pd.DataFrame(current_table).reset_index(drop=True))
+                current_table = []
+        else:
+            current_table.append(row)
+    if current_table:
+        tables.append(pd.DataFrame(current_table).reset_index(drop=True))
+    return tables
+
+
+def clean_and_prepare_table(table):
+    """
+    Use the first row as header and clean column names.
+    """
+    table.columns = table.iloc[0].astype(str).str.strip()
+    table = table.drop(table.index[0]).reset_index(drop=True)
+    table.columns = table.columns.str.strip()
+    return table
+
+
+def compute_rca_for_table(table):
+    """
+    Compute contributions, impact scores and RCA priority for a single KPI table.
+    Core math stays “pure” (no Multisimmer business overrides here).
+    """
+    # numeric conversion
+    for col in ["Pre", "Post", "Absolute Change", "% Change"]:
+        if col in table.columns:
+            table[col] = pd.to_numeric(
+                table[col].astype(str).str.replace(",", "").str.replace("%", ""),
+                errors="coerce",
+            )
+
+    section_col = table.columns[0]
+    totals_df = table[table[section_col] == "X"]
+
+    if totals_df.empty:
+        total_abs_change = table["Absolute Change"].dropna().sum()
+        total_post = table["Post"].dropna().sum()
+    else:
+        totals = totals_df.iloc[0]
+        total_abs_change = totals["Absolute Change"]
+        total_post = totals["Post"]
+
+    if not totals_df.empty:
+        valid_rows = table[
+            (table[section_col] != "X")
+            & table["Absolute Change"].notna()
+            & table["Post"].notna()
+        ]
+    else:
+        valid_rows = table[
+            table["Absolute Change"].notna() & table["Post"].notna()
+        ]
+
+    # ---- CORE MATH: NO special Multisimmer handling here ----
+    valid_rows["Contribution to Absolute Change (%)"] = (
+        valid_rows["Absolute Change"] / total_abs_change
+    ) * 100
+
+    valid_rows["Contribution to Post (%)"] = (
+        valid_rows["Post"] / total_post
+    ) * 100
+
+    valid_rows["Combined Impact Score"] = (
+        valid_rows["Contribution to Absolute Change (%)"].abs()
+        + valid_rows["Contribution to Post (%)"].abs()
+    )
+
+    valid_rows["RCA Priority"] = valid_rows["Combined Impact Score"].rank(
+        ascending=False
+    )
+
+    valid_rows["Section"] = section_col
+
+    return valid_rows
+
+
+def process_rca(tables):
+    """
+    Run RCA on all tables and combine them.
+    """
+    processed_tables = []
+    for table in tables:
+        table = clean_and_prepare_table(table)
+        expected_cols = {"Pre", "Post", "Absolute Change"}
+        if not expected_cols.issubset(set(table.columns)):
+            continue
+
+        # handle duplicate column names if any
+        if table.columns.duplicated().any():
+            cols = pd.Series(table.columns)
+            for dup in cols[cols.duplicated()].unique():
+                dups_idx = cols[cols == dup].index.tolist()
+                for i, col_idx in enumerate(dups_idx):
+                    if i > 0:
+                        cols[col_idx] = f"{dup}_{i}"
+            table.columns = cols
+
+        rca_table = compute_rca_for_table(table)
+        processed_tables.append(rca_table)
+
+    if not processed_tables:
+        return pd.DataFrame()
+
+    combined_df = pd.concat(processed_tables, ignore_index=True)
+    return combined_df
+
+
+# -------------- LABELS --------------
+
+
+def add_kpi_label_column(rca_df):
+    """
+    Add a human-readable KPI Segment Label like "Handset Type: Smartphone".
+    """
+    rca_df = rca_df.copy()
+
+    def get_label(row):
+        section = row["Section"]
+        value = row.get(section, None)
+        return f"{section}: {value}"
+
+    rca_df["KPI Segment Label"] = rca_df.apply(get_label, axis=1)
+    return rca_df
+
+
+# -------------- NARRATIVE (business view for GP/BL Multisim) --------------
+
+
+def _abs_change_business_view(row, section_col):
+    """
+    For narrative only:
+    - GP_MULTISIM / BL_MULTISIM: invert sign (increase = negative, decrease = positive).
+    - Others: keep original Absolute Change.
+    """
+    label = str(row[section_col])
+    ac = row["Absolute Change"]
+
+    if "GP_MULTISIM" in label or "BL_MULTISIM" in label:
+        return -ac
+    return ac
+
+
+def format_driver_row(row, section_col):
+    # Use business-view Absolute Change for sign in text
+    ac_business = _abs_change_business_view(row, section_col)
+    pct_change = row["% Change"] * 100
+    label = row[section_col]
+    return f"{label} ({ac_business:+,.2f} / {pct_change:+.2f}%)"
+
+
+def get_top_drivers_by_section(rca_df, section, top_n_pos=2, top_n_neg=2):
+    df_sec = rca_df[rca_df["Section"] == section].copy()
+    if df_sec.empty:
+        return [], []
+
+    # Add a business-view column just for narrative ranking
+    df_sec["AbsChange_business"] = df_sec.apply(
+        lambda r: _abs_change_business_view(r, section), axis=1
+    )
+
+    # Positive: largest business-view Absolute Change
+    pos = df_sec.sort_values("AbsChange_business", ascending=False).head(top_n_pos)
+
+    # Negative: smallest business-view Absolute Change
+    neg = df_sec.sort_values("AbsChange_business", ascending=True).head(top_n_neg)
+
+    pos_list = [format_driver_row(r, section) for _, r in pos.iterrows()]
+    neg_list = [format_driver_row(r, section) for _, r in neg.iterrows()]
+    return pos_list, neg_list
+
+
+def generate_structured_rca_text(rca_df, brand_name="Brand"):
+    sections_to_use = [
+        "Handset Type",
+        "Arpu Segment",
+        "Usage Category",
+        "Gb Slab",
+        "Base Type",
+        "Multisimmer",
+        "Clustername",
+        "Mou Slab",
+        "Aon Bucket",
+        "Vc User Category",
+    ]
+
+    lines = []
+    lines.append(f"{brand_name}: Key change drivers")
+    lines.append("")
+    lines.append("Biggest positive impact:")
+    for sec in sections_to_use:
+        pos, _ = get_top_drivers_by_section(rca_df, sec)
+        if pos:
+            lines.append(f"- {sec}:")
+            for item in pos:
+                lines.append(f"  - {item}")
+
+    lines.append("")
+    lines.append("Negative impacts / areas to watch:")
+    for sec in sections_to_use:
+        _, neg = get_top_drivers_by_section(rca_df, sec)
+        if neg:
+            lines.append(f"- {sec}:")
+            for item in neg:
+                lines.append(f"  - {item}")
+
+    return "\n".join(lines)
@@ -0,0 +1,149 @@
+"""
+Synthetic KPI workbooks in the same layout as sample.xlsx, for benchmarks.
+
+    python benchmarks/synthetic.py --out big.xlsx --sections 12 --segments 2000 --sheets 3
+
+Each sheet has the brand total block at the top and one blank-row separated
+section per dimension ("Section N" title row, blank row, header row,
+segment rows). Segment values of every section add up to the brand total.
+
+make_long_table builds long data (dimension columns + Pre / Post) for the
+drill-down and multi-dimensional RCA.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+HEADER = ["Pre", "Post", "Absolute Change", "% Change"]
+
+
+def make_sheet(brand, n_sections=10, n_segments=50, seed=0, section_names=None,
+               totals_rows=False):
+    """
+    Raw sheet (header=None layout, as read_multiple_tables sees it).
+    section_names names the first sections (the rest are "Section N");
+    with totals_rows every second section ends with an "X" totals row.
+    """
+    section_names = list(section_names or [])
+    rng = np.random.default_rng(seed)
+    brand_pre = rng.uniform(5e7, 1e8)
+    brand_post = brand_pre * rng.uniform(0.95, 1.05)
+
+    rows = [
+        [f"Selected filter: brand = {brand}", None, None, None, None],
+        ["Brand"] + HEADER,
+        [
+            brand,
+            brand_pre,
+            brand_post,
+            brand_post - brand_pre,
+            (brand_post - brand_pre) / brand_pre,
+        ],
+    ]
+    for s in range(n_sections):
+        name = section_names[s] if s < len(section_names) else f"Section {s + 1}"
+        pre = brand_pre * rng.dirichlet(np.ones(n_segments))
+        post = brand_post * rng.dirichlet(np.ones(n_segments))
+        rows.append([None] * 5)
+        rows.append([name, None, None, None, None])
+        rows.append([None] * 5)
+        rows.append([name] + HEADER)
+        for i in range(n_segments):
+            rows.append([
+                f"{i:05d}. Segment",
+                pre[i],
+                post[i],
+                post[i] - pre[i],
+                (post[i] - pre[i]) / pre[i],
+            ])
+        if totals_rows and s % 2 == 1:
+            rows.append([
+                "X",
+                pre.sum(),
+                post.sum(),
+                post.sum() - pre.sum(),
+                (post.sum() - pre.sum()) / pre.sum(),
+            ])
+    return pd.DataFrame(rows)
+
+
+def make_tables(n_sections=10, n_segments=50, seed=0, brand="Brand"):
+    """
+    Blank-row separated tables of one synthetic sheet, without going
+    through Excel (what read_multiple_tables would return).
+    """
+    sheet = make_sheet(brand, n_sections, n_segments, seed)
+    blank = sheet.isna().all(axis=1)
+    group_no = blank.cumsum()[~blank]
+    return [
+        block.reset_index(drop=True)
+        for _, block in sheet[~blank].groupby(group_no, sort=False)
+    ]
+
+
+LONG_DIMENSIONS = {
+    "Clustername": 20,
+    "Handset Type": 4,
+    "Arpu Segment": 8,
+    "Aon Bucket": 6,
+    "Usage Category": 5,
+}
+
+
+def make_long_table(n_rows=100_000, dimensions=None, seed=0):
+    """
+    Long segment data for hierarchical / multi-dimensional RCA: one column
+    per dimension ({name: number of segments}) plus Pre and Post. A few
+    planted cells move much more than the rest.
+    """
+    rng = np.random.default_rng(seed)
+    dimensions = dimensions or LONG_DIMENSIONS
+    df = pd.DataFrame({
+        dim: rng.integers(0, n, n_rows).astype(str)
+        for dim, n in dimensions.items()
+    })
+    for dim in dimensions:
+        df[dim] = dim.split()[0][:3].upper() + "_" + df[dim].str.zfill(2)
+
+    df["Pre"] = rng.gamma(2.0, 500.0, n_rows)
+    drift = rng.normal(1.0, 0.05, n_rows)
+    first, second = list(dimensions)[:2]
+    planted = (df[first] == df[first].iloc[0]) & (df[second] == df[second].iloc[0])
+    drift[planted.to_numpy()] -= 0.4
+    df["Post"] = df["Pre"] * drift
+    return df
+
+
+def write_workbook(path, n_sheets=1, n_sections=10, n_segments=50, seed=0,
+                   section_names=None, totals_rows=False):
+    """
+    Write an .xlsx with `n_sheets` brand sheets ("Brand 1", "Brand 2", ...).
+    """
+    with pd.ExcelWriter(path) as writer:
+        for b in range(n_sheets):
+            brand = f"Brand {b + 1}"
+            make_sheet(
+                brand, n_sections, n_segments, seed + b, section_names, totals_rows
+            ).to_excel(
+                writer, sheet_name=brand, header=False, index=False
+            )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic KPI workbook.")
+    parser.add_argument("--out", default="synthetic.xlsx")
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--segments", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_workbook(args.out, args.sheets, args.sections, args.segments, args.seed)
+    print("Synthetic workbook written to", args.out)
+
+
+if __name__ == "__main__":
+    main()
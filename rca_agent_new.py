@@ -1,27 +1,228 @@
+import csv
+import hashlib
 import os
+import zipfile
+from functools import lru_cache
+from io import BytesIO, StringIO
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import matplotlib.pyplot as plt
 
+from rca_config import load_catalogue
+
 
 # -------------- DATA LOADING & PREP --------------
 
 
+EXCEL_FORMATS = ("xlsx", "xlsb", "xls")
+INPUT_FORMATS = EXCEL_FORMATS + ("csv", "parquet")
+
+
+def _peek(source, n=8):
+    # first bytes of a path, raw bytes or a seekable file object
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:n])
+    if hasattr(source, "read"):
+        pos = source.tell()
+        head = source.read(n)
+        source.seek(pos)
+        return head
+    with open(source, "rb") as f:
+        return f.read(n)
+
+
+def detect_input_format(source):
+    """
+    "xlsx", "xlsb", "xls", "csv" or "parquet" for a path, bytes or file
+    object: from the extension when there is one, else from the magic bytes.
+    """
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+    ext = os.path.splitext(str(name))[1].lower().lstrip(".")
+    if ext in INPUT_FORMATS:
+        return ext
+    if ext in ("xlsm", "xltx"):
+        return "xlsx"
+
+    head = _peek(source)
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.startswith(b"\xd0\xcf\x11\xe0"):
+        return "xls"
+    if head.startswith(b"PK\x03\x04"):
+        with zipfile.ZipFile(_as_readable(source)) as archive:
+            names = archive.namelist()
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return "xlsb" if "xl/workbook.bin" in names else "xlsx"
+    return "csv"
+
+
+def excel_engine(fmt="xlsx"):
+    """
+    Fastest installed pandas engine for an Excel format: calamine (Rust,
+    python-calamine package) when available, else the pandas default.
+    """
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "pyxlsb" if fmt == "xlsb" else None
+
+
+def _as_readable(source):
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _read_ragged_csv(source):
+    # rows of an exported sheet have different lengths (a one-cell title
+    # row, then five-column sections): read_csv would take the width from
+    # the first line, so count the widest row first
+    if hasattr(source, "read"):
+        data = source.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    text = data.decode("utf-8-sig")
+    n_columns = max((len(row) for row in csv.reader(StringIO(text))), default=0)
+    if n_columns == 0:
+        return pd.DataFrame()
+    return pd.read_csv(
+        StringIO(text), header=None, names=range(n_columns), skip_blank_lines=False
+    )
+
+
+def load_sheet(source, sheet_name=0, fmt=None):
+    """
+    One sheet as a raw frame (no header row applied, like
+    pd.read_excel(header=None)) from an Excel workbook, a CSV export or a
+    Parquet export. CSV / Parquet hold a single sheet, so sheet_name is
+    ignored for them.
+    """
+    fmt = fmt or detect_input_format(source)
+    source = _as_readable(source)
+    if fmt == "csv":
+        # keep blank rows: they separate the sections
+        return _read_ragged_csv(source)
+    if fmt == "parquet":
+        df = pd.read_parquet(source)
+        df.columns = range(df.shape[1])
+        return df
+    return pd.read_excel(
+        source, sheet_name=sheet_name, header=None, engine=excel_engine(fmt)
+    )
+
+
+def split_sections(df):
+    """
+    Split a raw sheet into its blank-row separated tables in one grouped
+    pass (rows keep their values; each table gets a fresh 0..n index).
+    """
+    blank = df.isna().all(axis=1)
+    section_no = blank.cumsum()[~blank]
+    return [
+        table.reset_index(drop=True)
+        for _, table in df[~blank].groupby(section_no, sort=False)
+    ]
+
+
+class WorkbookSession:
+    """
+    A workbook opened once for any number of sheet reads.
+
+    The file is opened (zip directory, shared strings, sheet list) a single
+    time; each sheet is parsed on first use and kept, so reading two sheets,
+    or the same sheet twice, costs one parse per sheet rather than one
+    workbook open per read. CSV / Parquet inputs act as a one-sheet
+    workbook. Pass the session to read_multiple_tables instead of a path.
+    """
+
+    def __init__(self, source, fmt=None):
+        self.format = fmt or detect_input_format(source)
+        self._source = _as_readable(source)
+        self._raw = {}
+        if self.format in EXCEL_FORMATS:
+            self._book = pd.ExcelFile(self._source, engine=excel_engine(self.format))
+            self.sheet_names = list(self._book.sheet_names)
+        else:
+            self._book = None
+            self.sheet_names = ["Sheet1"]
+
+    def _name(self, sheet_name):
+        if self._book is None:
+            # single-sheet input: any sheet name means that sheet, as in load_sheet
+            return self.sheet_names[0]
+        # same errors (and messages) as pd.read_excel for a missing sheet
+        if isinstance(sheet_name, int):
+            if not -len(self.sheet_names) <= sheet_name < len(self.sheet_names):
+                raise ValueError(
+                    f"Worksheet index {sheet_name} is invalid, "
+                    f"{len(self.sheet_names)} worksheets found"
+                )
+            return self.sheet_names[sheet_name]
+        if sheet_name not in self.sheet_names:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        return sheet_name
+
+    def sheets(self, sheet_names=None):
+        """
+        {name: raw frame} for `sheet_names` (default: all sheets); sheets not
+        parsed yet are parsed together in one call.
+        """
+        names = list(dict.fromkeys(
+            self._name(name) for name in (sheet_names or self.sheet_names)
+        ))
+        missing = [name for name in names if name not in self._raw]
+        if missing:
+            if self._book is None:
+                self._raw[missing[0]] = load_sheet(self._source, fmt=self.format)
+            else:
+                self._raw.update(self._book.parse(sheet_name=missing, header=None))
+        return {name: self._raw[name] for name in names}
+
+    def sheet(self, sheet_name=0):
+        return self.sheets([sheet_name])[self._name(sheet_name)]
+
+    def tables(self, sheet_name=0):
+        return split_sections(self.sheet(sheet_name))
+
+    def iter_tables(self, sheet_names=None):
+        """
+        Yield (sheet name, tables) for `sheet_names` (default: all sheets),
+        one sheet in memory at a time: for batch runs over many brand sheets.
+        """
+        for name in sheet_names or self.sheet_names:
+            name = self._name(name)
+            if name in self._raw or self._book is None:
+                yield name, self.tables(name)
+            else:
+                yield name, split_sections(self._book.parse(name, header=None))
+
+    def close(self):
+        if self._book is not None:
+            self._book.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 def read_multiple_tables(file_path, sheet_name=0):
     """
     Split a sheet into multiple logical tables using blank rows as separators.
+    file_path may be an Excel workbook, a CSV or a Parquet export (see
+    load_sheet), as a path, bytes or a file object, or a WorkbookSession.
     """
-    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
-    tables, current_table = [], []
-    for _, row in df.iterrows():
-        if row.isnull().all():
-            if current_table:
-                tables.append(pd.DataFrame(current_table).reset_index(drop=True))
-                current_table = []
-        else:
-            current_table.append(row)
-    if current_table:
-        tables.append(pd.DataFrame(current_table).reset_index(drop=True))
-    return tables
+    if isinstance(file_path, WorkbookSession):
+        return file_path.tables(sheet_name)
+    return split_sections(load_sheet(file_path, sheet_name=sheet_name))
 
 
 def clean_and_prepare_table(table):
@@ -34,45 +235,159 @@ def clean_and_prepare_table(table):
     return table
 
 
-def compute_rca_for_table(table):
+# -------------- HEADER SCHEMAS --------------
+
+
+# section catalogue (rca_config.toml), compiled once at import
+CATALOGUE = load_catalogue()
+RCA_COLUMNS = CATALOGUE.required_metrics
+METRIC_COLUMNS = list(CATALOGUE.metric_columns)
+TOTALS_MARKERS = CATALOGUE.totals_markers
+
+
+def dedupe_column_names(names):
     """
-    Compute contributions, impact scores and RCA priority for a single KPI table.
-    Core math stays “pure” (no Multisimmer business overrides here).
+    Rename repeated column names in linear time: the second "Pre" becomes
+    "Pre_1", the third "Pre_2", and so on.
     """
-    # numeric conversion
-    for col in ["Pre", "Post", "Absolute Change", "% Change"]:
-        if col in table.columns:
+    names = pd.Index(names)
+    repeat_no = (
+        pd.Series(np.arange(len(names)))
+        .groupby(names, sort=False, dropna=False)
+        .cumcount()
+        .to_numpy()
+    )
+    if not repeat_no.any():
+        return names
+    renamed = names.astype(str) + "_" + repeat_no.astype(str)
+    return pd.Index(np.where(repeat_no > 0, renamed, names))
+
+
+@lru_cache(maxsize=1024)
+def _resolve_header(header):
+    # header is a tuple of stripped header strings, None for empty cells;
+    # section / metric aliases are mapped here, once per distinct header
+    header = CATALOGUE.canonical_header(header)
+    columns = pd.Index([np.nan if name is None else name for name in header])
+    is_rca_table = RCA_COLUMNS.issubset(set(columns))
+    return tuple(dedupe_column_names(columns)), is_rca_table
+
+
+def resolve_table_schemas(tables):
+    """
+    Work out the header layout of every section in one pass.
+
+    The first row of every table is stacked into one frame and stringified
+    once; each distinct header is then resolved (deduped column names and
+    whether it is an RCA table) through a cache, so layouts that recur
+    across sections and sheets are only resolved once.
+    Returns one (columns, is_rca_table) pair per table.
+    """
+    if not tables:
+        return []
+
+    header_rows = pd.DataFrame(
+        [table.iloc[0].to_numpy(dtype=object) for table in tables],
+        dtype=object,
+    )
+    header_rows = header_rows.astype(str).apply(lambda col: col.str.strip())
+    header_rows = header_rows.astype(object).where(header_rows.notna(), None)
+
+    schemas = []
+    for table, header in zip(tables, header_rows.itertuples(index=False, name=None)):
+        schemas.append(_resolve_header(header[:table.shape[1]]))
+    return schemas
+
+
+def _to_numeric_columns(table):
+    """
+    Convert the metric columns ("1,234", "5%") of a section to numbers.
+    Columns that are already numeric are left alone.
+    """
+    for col in METRIC_COLUMNS:
+        if col in table.columns and not pd.api.types.is_numeric_dtype(table[col]):
             table[col] = pd.to_numeric(
                 table[col].astype(str).str.replace(",", "").str.replace("%", ""),
                 errors="coerce",
             )
+    return table
+
+
+CONTRIBUTION_MODES = ("total", "gross", "auto")
+NEAR_ZERO_TOTAL_RATIO = 0.05
+
+
+def _resolve_contribution_mode(contribution_mode, total_abs_change, gross_change):
+    """
+    "auto" falls back to "gross" when the net total change is under
+    NEAR_ZERO_TOTAL_RATIO of the gross movement (segments moving both ways
+    and cancelling out), where dividing by the net total blows up.
+    """
+    if contribution_mode not in CONTRIBUTION_MODES:
+        raise ValueError(
+            f"contribution_mode must be one of {', '.join(CONTRIBUTION_MODES)}"
+        )
+    if contribution_mode != "auto":
+        return contribution_mode
+    if gross_change and abs(total_abs_change) < NEAR_ZERO_TOTAL_RATIO * gross_change:
+        return "gross"
+    return "total"
+
+
+def compute_rca_for_table(table, totals=None, contribution_mode="total",
+                          total_marker=TOTALS_MARKERS):
+    """
+    Compute contributions, impact scores and RCA priority for a single KPI table.
+    Core math stays “pure” (no Multisimmer business overrides here).
+
+    totals, if given, is this table's row of build_totals_index; otherwise
+    the totals are looked up from the table itself.
+
+    total_marker is the first-column value of the wide layout's totals row
+    (a list allowed); None for tables that cannot have one, e.g. the
+    long-layout slices of rca_hierarchy, where a segment may well be
+    named "X".
+
+    contribution_mode picks the denominator of "Contribution to Absolute
+    Change (%)" (and so of the impact score and priority):
+    - "total": the section's net total change (the original behaviour).
+    - "gross": the sum of |segment change|, i.e. each segment's signed share
+      of all movement; stays within +-100% when the net total is near zero.
+    - "auto": "total", unless the net total is near zero (see
+      _resolve_contribution_mode).
+    "Share of Gross Change (%)" is added in every mode, and "Contribution
+    Mode" records the mode used.
+    """
+    # numeric conversion
+    table = _to_numeric_columns(table)
 
     section_col = table.columns[0]
-    totals_df = table[table[section_col] == "X"]
+    if totals is None:
+        totals = build_totals_index([table], total_marker or ()).iloc[0]
 
-    if totals_df.empty:
-        total_abs_change = table["Absolute Change"].dropna().sum()
-        total_post = table["Post"].dropna().sum()
-    else:
-        totals = totals_df.iloc[0]
-        total_abs_change = totals["Absolute Change"]
-        total_post = totals["Post"]
-
-    if not totals_df.empty:
-        valid_rows = table[
-            (table[section_col] != "X")
-            & table["Absolute Change"].notna()
-            & table["Post"].notna()
-        ]
-    else:
-        valid_rows = table[
-            table["Absolute Change"].notna() & table["Post"].notna()
-        ]
+    total_abs_change = totals["Total Absolute Change"]
+    total_post = totals["Total Post"]
+
+    # segments only: without a totals row, this keeps every row
+    is_segment = table["Absolute Change"].notna() & table["Post"].notna()
+    if total_marker is not None:
+        markers = [total_marker] if isinstance(total_marker, str) else list(total_marker)
+        is_segment &= ~table[section_col].isin(markers)
+    valid_rows = table[is_segment]
 
     # ---- CORE MATH: NO special Multisimmer handling here ----
-    valid_rows["Contribution to Absolute Change (%)"] = (
-        valid_rows["Absolute Change"] / total_abs_change
-    ) * 100
+    gross_change = valid_rows["Absolute Change"].abs().sum()
+    share_of_gross = (
+        valid_rows["Absolute Change"] / gross_change * 100 if gross_change else 0.0
+    )
+    mode = _resolve_contribution_mode(contribution_mode, total_abs_change, gross_change)
+
+    if mode == "gross":
+        valid_rows["Contribution to Absolute Change (%)"] = share_of_gross
+    else:
+        valid_rows["Contribution to Absolute Change (%)"] = (
+            valid_rows["Absolute Change"] / total_abs_change
+        ) * 100
 
     valid_rows["Contribution to Post (%)"] = (
         valid_rows["Post"] / total_post
@@ -88,39 +403,683 @@ def compute_rca_for_table(table):
     )
 
     valid_rows["Section"] = section_col
+    valid_rows["Share of Gross Change (%)"] = share_of_gross
+    valid_rows["Contribution Mode"] = mode
 
     return valid_rows
 
 
-def process_rca(tables):
+def _prepare_table(table, schema=None):
+    """
+    Turn one raw section into an RCA-ready table with numeric metrics.
+    schema is its entry from resolve_table_schemas (resolved here if not
+    given). Returns None for sections that are not RCA tables (titles,
+    notes, ...).
+    """
+    if schema is None:
+        schema = resolve_table_schemas([table])[0]
+    columns, is_rca_table = schema
+    if not is_rca_table:
+        return None
+
+    table = table.iloc[1:].reset_index(drop=True)
+    table.columns = pd.Index(columns, name=0)
+    return _to_numeric_columns(table)
+
+
+def process_rca(tables, progress_callback=None, cache=None, contribution_mode="total",
+                return_totals=False):
     """
     Run RCA on all tables and combine them.
+    contribution_mode is passed to compute_rca_for_table for every section.
+
+    progress_callback, if given, is called as progress_callback(done, total)
+    while tables are prepared and computed (background jobs use it for
+    progress and cancellation).
+
+    cache, if given, is a SectionResultCache: sections whose raw cells are
+    unchanged since the previous run with that cache are reused instead of
+    recomputed (see cache.last_stats for the counts).
+
+    return_totals: return (combined result, totals) instead, totals being
+    the build_totals_index rows of the RCA sections in result order (what
+    section_totals gives, without preparing the tables again; rows of
+    reused sections come from the cache).
     """
-    processed_tables = []
-    for table in tables:
-        table = clean_and_prepare_table(table)
-        expected_cols = {"Pre", "Post", "Absolute Change"}
-        if not expected_cols.issubset(set(table.columns)):
+    results = [None] * len(tables)
+    totals_rows = [None] * len(tables)
+    fingerprints = [None] * len(tables)
+    reused = 0
+
+    # pass 1: clean every section that is not already cached
+    schemas = resolve_table_schemas(tables)
+    to_compute = []
+    for i, table in enumerate(tables):
+        if progress_callback is not None:
+            progress_callback(i, 2 * len(tables))
+
+        if cache is not None:
+            fingerprints[i] = (section_fingerprint(table), contribution_mode)
+            if fingerprints[i] in cache.results:
+                results[i] = cache.results[fingerprints[i]]
+                totals_rows[i] = cache.totals.get(fingerprints[i])
+                if results[i] is not None:
+                    reused += 1
+                continue
+
+        prepared = _prepare_table(table, schemas[i])
+        if prepared is not None:
+            to_compute.append((i, prepared))
+
+    # pass 2: totals for all sections in one go, then the per-section math
+    totals_index = build_totals_index([prepared for _, prepared in to_compute])
+    for (i, _), row in zip(to_compute, totals_index.to_dict("records")):
+        totals_rows[i] = row
+    for n, (i, prepared) in enumerate(to_compute):
+        if progress_callback is not None:
+            progress_callback(len(tables) + n, len(tables) + len(to_compute))
+        results[i] = compute_rca_for_table(
+            prepared, totals=totals_index.iloc[n], contribution_mode=contribution_mode
+        )
+
+    if progress_callback is not None:
+        progress_callback(len(tables), len(tables))
+
+    if cache is not None:
+        # keep only sections of this run, so the cache tracks the latest
+        # version of the workbook instead of growing with every refresh
+        cache.results = dict(zip(fingerprints, results))
+        cache.totals = dict(zip(fingerprints, totals_rows))
+        cache.last_stats = {"reused": reused, "recomputed": len(to_compute)}
+
+    processed_tables = [rca_table for rca_table in results if rca_table is not None]
+    combined_df = (
+        pd.concat(processed_tables, ignore_index=True) if processed_tables else pd.DataFrame()
+    )
+    if not return_totals:
+        return combined_df
+
+    totals = build_totals_index([])
+    rows = [row for row, result in zip(totals_rows, results) if result is not None]
+    if rows:
+        totals = pd.DataFrame.from_records(rows, columns=totals.columns)
+    return combined_df, totals
+
+
+# -------------- TOTALS & RECONCILIATION --------------
+
+
+def build_totals_index(tables, total_marker=TOTALS_MARKERS):
+    """
+    Index the totals of all prepared sections in one vectorized pass.
+
+    Row n describes tables[n]:
+    - Total Absolute Change / Total Post: the section's "X" totals row if it
+      has one, otherwise the column sums (the RCA denominators).
+    - Segment Absolute Change / Segment Post: sums over segment rows only.
+    - Segments: number of segment rows, i.e. of rows compute_rca_for_table
+      returns for the section.
+
+    total_marker is the totals-row marker, or a list of them (default: the
+    catalogue's totals_markers).
+    """
+    markers = [total_marker] if isinstance(total_marker, str) else list(total_marker)
+    index_cols = [
+        "Section",
+        "Has Totals Row",
+        "Total Absolute Change",
+        "Total Post",
+        "Segment Absolute Change",
+        "Segment Post",
+        "Segments",
+    ]
+    if not tables:
+        return pd.DataFrame(columns=index_cols)
+
+    long_df = pd.concat(
+        [
+            pd.DataFrame({
+                "table_no": n,
+                "is_total": table.iloc[:, 0].isin(markers).to_numpy(),
+                "Absolute Change": table["Absolute Change"].to_numpy(),
+                "Post": table["Post"].to_numpy(),
+            })
+            for n, table in enumerate(tables)
+        ],
+        ignore_index=True,
+    )
+    metrics = ["Absolute Change", "Post"]
+    table_nos = pd.RangeIndex(len(tables))
+
+    marker_rows = (
+        long_df[long_df["is_total"]]
+        .drop_duplicates("table_no")
+        .set_index("table_no")[metrics]
+        .reindex(table_nos)
+    )
+    column_sums = (
+        long_df[~long_df["is_total"]]
+        .groupby("table_no")[metrics].sum()
+        .reindex(table_nos, fill_value=0)
+    )
+    is_segment = (
+        ~long_df["is_total"]
+        & long_df["Absolute Change"].notna()
+        & long_df["Post"].notna()
+    )
+    segment_sums = (
+        long_df[is_segment]
+        .groupby("table_no")[metrics].sum()
+        .reindex(table_nos, fill_value=0)
+    )
+    has_totals_row = pd.Series(
+        table_nos.isin(long_df.loc[long_df["is_total"], "table_no"]),
+        index=table_nos,
+    )
+
+    return pd.DataFrame({
+        "Section": [table.columns[0] for table in tables],
+        "Has Totals Row": has_totals_row,
+        "Total Absolute Change": marker_rows["Absolute Change"].where(
+            has_totals_row, column_sums["Absolute Change"]
+        ),
+        "Total Post": marker_rows["Post"].where(
+            has_totals_row, column_sums["Post"]
+        ),
+        "Segment Absolute Change": segment_sums["Absolute Change"],
+        "Segment Post": segment_sums["Post"],
+        "Segments": np.bincount(
+            long_df.loc[is_segment, "table_no"], minlength=len(tables)
+        ),
+    })[index_cols]
+
+
+def find_brand_total(tables, brand_header=CATALOGUE.brand_header):
+    """
+    Locate the brand-level total at the top of the sheet: the row under the
+    "Brand | Pre | Post | Absolute Change | % Change" header.
+    Works on the raw tables from read_multiple_tables. Returns None if not
+    found.
+    """
+    if not tables:
+        return None
+    # first columns of all tables stacked: one comparison finds every
+    # candidate header row
+    lengths = np.array([len(table) for table in tables])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    first_col = np.concatenate(
+        [table.iloc[:, 0].astype(str).str.strip().to_numpy() for table in tables]
+    )
+    hits = np.flatnonzero(first_col == brand_header)
+    table_nos = np.searchsorted(starts, hits, side="right") - 1
+    positions = hits - starts[table_nos]
+    keep = positions + 1 < lengths[table_nos]
+
+    for table_no, pos in zip(table_nos[keep], positions[keep]):
+        table = tables[table_no]
+        brand_df = table.iloc[[pos + 1]].copy()
+        # same alias resolution as the section headers (LMTD -> Pre, ...)
+        columns, _ = _resolve_header(tuple(table.iloc[pos].astype(str).str.strip()))
+        brand_df.columns = list(columns)
+        if "Absolute Change" not in brand_df.columns:
             continue
+        return _to_numeric_columns(brand_df).iloc[0]
+    return None
+
+
+def _relative_difference(difference, brand_value):
+    if brand_value:
+        return difference.abs() / abs(brand_value) * 100
+    return pd.Series(np.where(difference == 0, 0.0, np.inf), index=difference.index)
+
+
+def reconcile_section_totals(totals, brand_total, tolerance=0.01):
+    """
+    Check every section's segment sums of Absolute Change and Post against
+    the brand-level total (see find_brand_total), reading them from the
+    totals index (build_totals_index / section_totals) in one vectorized
+    check.
+
+    Returns one row per section with the relative differences and a
+    "Diverges" flag (either difference > tolerance x |brand total|).
+    """
+    recon = totals.groupby("Section", sort=False).agg({
+        "Has Totals Row": "any",
+        "Segment Absolute Change": "sum",
+        "Segment Post": "sum",
+    }).reset_index()
+
+    brand_abs_change = brand_total["Absolute Change"]
+    recon["Brand Absolute Change"] = brand_abs_change
+    recon["Difference"] = recon["Segment Absolute Change"] - brand_abs_change
+    recon["Relative Difference (%)"] = _relative_difference(
+        recon["Difference"], brand_abs_change
+    )
+
+    brand_post = brand_total.get("Post", np.nan)
+    recon["Brand Post"] = brand_post
+    recon["Post Relative Difference (%)"] = (
+        _relative_difference(recon["Segment Post"] - brand_post, brand_post)
+        if pd.notna(brand_post) else 0.0
+    )
+    recon["Diverges"] = (
+        (recon["Relative Difference (%)"] > tolerance * 100)
+        | (recon["Post Relative Difference (%)"] > tolerance * 100)
+    )
+    return recon
+
+
+# -------------- VOLUME / RATE / MIX DECOMPOSITION --------------
 
-        # handle duplicate column names if any
-        if table.columns.duplicated().any():
-            cols = pd.Series(table.columns)
-            for dup in cols[cols.duplicated()].unique():
-                dups_idx = cols[cols == dup].index.tolist()
-                for i, col_idx in enumerate(dups_idx):
-                    if i > 0:
-                        cols[col_idx] = f"{dup}_{i}"
-            table.columns = cols
 
-        rca_table = compute_rca_for_table(table)
-        processed_tables.append(rca_table)
+DECOMPOSITION_COLUMNS = [
+    "Volume Pre",
+    "Volume Post",
+    "Rate Pre",
+    "Rate Post",
+    "Volume Effect",
+    "Mix Effect",
+    "Rate Effect",
+]
 
-    if not processed_tables:
+
+def _segment_keys(rca_df, keys):
+    frame = pd.DataFrame({key: rca_df[key] for key in keys})
+    frame["Segment"] = _segment_values(rca_df).astype(str).to_numpy()
+    return frame
+
+
+def decompose_volume_rate_mix(rca_df, volume_df, keys=("Section",)):
+    """
+    Split each segment's Absolute Change into volume, mix and rate effects.
+
+    rca_df is the revenue RCA result and volume_df the RCA result of the
+    same sections for a volume metric (e.g. subscribers), both from
+    process_rca. Rows are matched on `keys` + segment name, so many sheets
+    are decomposed in one pass when both frames carry a brand / sheet key
+    (keys=("Brand", "Section")).
+
+    Per segment i of a section (V volume, R = revenue / volume, s = share
+    of the section's volume, 0 = Pre, 1 = Post):
+
+    - Volume Effect = (V1_total - V0_total) * s0_i * R0_i
+    - Mix Effect    = V1_total * (s1_i - s0_i) * R0_i
+    - Rate Effect   = V1_i * (R1_i - R0_i)
+
+    The three add up to Absolute Change. Segments without Pre volume are
+    valued at their Post rate, so their change is volume / mix only.
+    Segments missing from volume_df get NaN effects.
+    """
+    keys = list(keys)
+    volume = _segment_keys(volume_df, keys)
+    volume["Volume Pre"] = volume_df["Pre"].to_numpy(dtype=float, na_value=np.nan)
+    volume["Volume Post"] = volume_df["Post"].to_numpy(dtype=float, na_value=np.nan)
+    section_totals = (
+        volume.groupby(keys, sort=False)[["Volume Pre", "Volume Post"]]
+        .sum()
+        .rename(columns={"Volume Pre": "V0 Total", "Volume Post": "V1 Total"})
+        .reset_index()
+    )
+
+    merged = (
+        _segment_keys(rca_df, keys)
+        .merge(volume.drop_duplicates(keys + ["Segment"]), on=keys + ["Segment"], how="left")
+        .merge(section_totals, on=keys, how="left")
+    )
+
+    v0 = merged["Volume Pre"].to_numpy()
+    v1 = merged["Volume Post"].to_numpy()
+    v0_total = merged["V0 Total"].to_numpy()
+    v1_total = merged["V1 Total"].to_numpy()
+    rev0 = rca_df["Pre"].to_numpy(dtype=float, na_value=np.nan)
+    rev1 = rca_df["Post"].to_numpy(dtype=float, na_value=np.nan)
+    change = rca_df["Absolute Change"].to_numpy(dtype=float, na_value=np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate_pre = np.where(v0 > 0, rev0 / v0, np.nan)
+        rate_post = np.where(v1 > 0, rev1 / v1, np.nan)
+        base_rate = np.where(v0 > 0, rate_pre, np.nan_to_num(rate_post))
+        share_pre = np.where(v0_total > 0, v0 / v0_total, 0.0)
+        share_post = np.where(v1_total > 0, v1 / v1_total, 0.0)
+
+    volume_effect = (v1_total - v0_total) * share_pre * base_rate
+    mix_effect = v1_total * (share_post - share_pre) * base_rate
+    matched = ~np.isnan(v0) & ~np.isnan(v1)
+
+    out = rca_df.copy(deep=False)
+    out["Volume Pre"] = v0
+    out["Volume Post"] = v1
+    out["Rate Pre"] = rate_pre
+    out["Rate Post"] = rate_post
+    out["Volume Effect"] = np.where(matched, volume_effect, np.nan)
+    out["Mix Effect"] = np.where(matched, mix_effect, np.nan)
+    out["Rate Effect"] = np.where(matched, change - volume_effect - mix_effect, np.nan)
+    return out
+
+
+# -------------- SIGNIFICANCE (noise filter) --------------
+
+
+def stack_history(rca_results, periods=None):
+    """
+    Stack RCA results of prior periods (oldest first) into one history
+    frame with a "Period" column, for score_significance.
+    """
+    periods = periods if periods is not None else range(len(rca_results))
+    frames = []
+    for period, rca_df in zip(periods, rca_results):
+        if rca_df is None or rca_df.empty:
+            continue
+        frame = rca_df.copy(deep=False)
+        frame["Period"] = period
+        frames.append(frame)
+    if not frames:
         return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def score_significance(rca_df, history_df, keys=("Section",), window=12,
+                       min_periods=3, z_threshold=2.0):
+    """
+    How unusual each segment's % Change is against its own history.
+
+    history_df is stack_history of earlier RCA results. For every segment
+    (matched on `keys` + segment name) the mean and standard deviation of
+    % Change over its last `window` periods are computed in one grouped
+    pass, and the current % Change is scored as a z-score.
+
+    Adds:
+    - "Expected % Change", "% Change Std", "History Periods", "Z-Score"
+    - "Noise Flag": |z| < z_threshold, i.e. the move is within the
+      segment's usual variation (False when history is too short to tell)
+    - "Adjusted Impact Score": Combined Impact Score scaled by
+      min(1, |z| / z_threshold), so noisy drivers sink
+    - "Adjusted RCA Priority": rank of the adjusted score per section
+    """
+    keys = list(keys)
+    out = rca_df.copy(deep=False)
+    current = _segment_keys(rca_df, keys)
+
+    if history_df is None or history_df.empty:
+        stats = pd.DataFrame(
+            columns=keys + ["Segment", "Expected % Change", "% Change Std", "History Periods"]
+        )
+    else:
+        history = _segment_keys(history_df, keys)
+        history["% Change"] = history_df["% Change"].to_numpy(dtype=float, na_value=np.nan)
+        history["Period"] = history_df["Period"].to_numpy()
+        history = history.sort_values("Period", kind="stable")
+        history = history.groupby(keys + ["Segment"], sort=False).tail(window)
+        stats = (
+            history.groupby(keys + ["Segment"], sort=False)["% Change"]
+            .agg(["mean", "std", "count"])
+            .rename(columns={
+                "mean": "Expected % Change",
+                "std": "% Change Std",
+                "count": "History Periods",
+            })
+            .reset_index()
+        )
+
+    merged = current.merge(stats, on=keys + ["Segment"], how="left")
+    periods = merged["History Periods"].fillna(0).to_numpy(dtype=int)
+    expected = merged["Expected % Change"].to_numpy(dtype=float, na_value=np.nan)
+    spread = merged["% Change Std"].to_numpy(dtype=float, na_value=np.nan)
+    pct_change = rca_df["% Change"].to_numpy(dtype=float, na_value=np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (pct_change - expected) / spread
+    z = np.where(spread == 0, np.where(pct_change == expected, 0.0, np.inf), z)
+    z = np.where(periods >= min_periods, z, np.nan)
+
+    weight = np.where(np.isnan(z), 1.0, np.minimum(1.0, np.abs(z) / z_threshold))
+
+    out["Expected % Change"] = expected
+    out["% Change Std"] = spread
+    out["History Periods"] = periods
+    out["Z-Score"] = z
+    out["Noise Flag"] = ~np.isnan(z) & (np.abs(z) < z_threshold)
+    out["Adjusted Impact Score"] = out["Combined Impact Score"].to_numpy() * weight
+    out["Adjusted RCA Priority"] = out.groupby(keys, sort=False)[
+        "Adjusted Impact Score"
+    ].rank(ascending=False)
+    return out
+
+
+def drop_noise(rca_df):
+    """
+    rca_df without the rows score_significance flagged as noise (as is
+    when it was not scored).
+    """
+    if "Noise Flag" not in rca_df.columns:
+        return rca_df
+    return rca_df[~rca_df["Noise Flag"].astype(bool)]
+
+
+# -------------- INCREMENTAL RECOMPUTE --------------
 
-    combined_df = pd.concat(processed_tables, ignore_index=True)
-    return combined_df
+
+def section_fingerprint(table):
+    """
+    Hash of a raw section's cells (header row included), used to spot
+    sections that did not change between two refreshes of a workbook.
+    """
+    hashed = pd.util.hash_pandas_object(table.astype(str), index=False)
+    digest = hashlib.sha1(str(table.shape).encode("utf-8"))
+    digest.update(hashed.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class SectionResultCache:
+    """
+    Section-level RCA results (and totals index rows) from the previous run,
+    keyed by fingerprint and contribution mode.
+    Pass the same instance to process_rca on every refresh of a workbook.
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.totals = {}
+        self.last_stats = {"reused": 0, "recomputed": 0}
+
+
+# -------------- WHAT-IF SIMULATOR --------------
+
+
+WHAT_IF_COLUMNS = [
+    "Post",
+    "Absolute Change",
+    "% Change",
+    "Contribution to Absolute Change (%)",
+    "Contribution to Post (%)",
+    "Combined Impact Score",
+    "RCA Priority",
+    "Share of Gross Change (%)",
+]
+
+
+def section_totals(tables):
+    """
+    build_totals_index of the RCA sections among a sheet's raw tables, i.e.
+    the denominators process_rca used for them (see WhatIfModel).
+    """
+    schemas = resolve_table_schemas(tables)
+    prepared = [_prepare_table(table, schema) for table, schema in zip(tables, schemas)]
+    return build_totals_index([table for table in prepared if table is not None])
+
+
+class WhatIfModel:
+    """
+    "What if this segment had moved differently?" on an RCA result, without
+    rerunning process_rca.
+
+    Each section's aggregates (total change, total Post, gross change) are
+    kept next to the segment values. Overriding one segment's Post or
+    Absolute Change shifts its section's aggregates in O(1); contributions,
+    Combined Impact Score and RCA Priority are recomputed, vectorized, only
+    for the sections touched since the last frame(). Other columns (volume /
+    mix / rate, significance) keep their values for the actual data.
+
+    rca_df is process_rca output (labelled or not), totals the matching
+    section_totals (or process_rca(..., return_totals=True)); without
+    totals the segment sums are used, which is what process_rca does for
+    sections without an "X" row. contribution_mode as for process_rca.
+
+    Sections are the tables of the sheet, in result order, so two tables
+    with the same name keep their own totals: `sections` holds one name
+    per table, section_rows(n) the rows of table n.
+    """
+
+    def __init__(self, rca_df, totals=None, contribution_mode="total"):
+        self.base = rca_df.reset_index(drop=True)
+        self.contribution_mode = contribution_mode
+
+        names = self.base["Section"].to_numpy(dtype=object)
+        if totals is not None and totals["Segments"].sum() == len(names):
+            counts = totals["Segments"].to_numpy(dtype=int)
+        elif len(names):
+            # no usable totals: a new table wherever the Section changes
+            starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+            counts = np.diff(np.r_[starts, len(names)])
+        else:
+            counts = np.zeros(0, dtype=int)
+        n_sections = len(counts)
+        self._section_of = np.repeat(np.arange(n_sections), counts)
+        self._rows = np.split(np.arange(len(names)), np.cumsum(counts)[:-1])
+        self.sections = names[np.cumsum(counts) - counts]
+
+        abs_change = self.base["Absolute Change"].to_numpy(dtype=float)
+        post = self.base["Post"].to_numpy(dtype=float)
+        self._base_total_abs = np.bincount(self._section_of, abs_change, n_sections)
+        self._base_total_post = np.bincount(self._section_of, post, n_sections)
+        if totals is not None and len(totals) == n_sections:
+            # row n of the totals index is table n
+            for column, sums in [
+                ("Total Absolute Change", self._base_total_abs),
+                ("Total Post", self._base_total_post),
+            ]:
+                given = totals[column].to_numpy(dtype=float)
+                sums[:] = np.where(np.isnan(given), sums, given)
+        self._base_gross = np.bincount(self._section_of, np.abs(abs_change), n_sections)
+        self.reset()
+
+    def section_rows(self, section):
+        """
+        Row positions (in rca_df) of section table number `section`.
+        """
+        return self._rows[section]
+
+    def reset(self, row=None):
+        """
+        Drop the override of `row`, or of every segment when row is None.
+        """
+        if row is not None:
+            if row in self.overrides:
+                values = self._values
+                section = self._section_of[row]
+                delta = self.base.at[row, "Post"] - values["Post"][row]
+                base_abs = self.base.at[row, "Absolute Change"]
+                self._gross[section] += abs(base_abs) - abs(values["Absolute Change"][row])
+                self._total_abs[section] += delta
+                self._total_post[section] += delta
+                for column in ("Post", "Absolute Change", "% Change"):
+                    values[column][row] = self.base.at[row, column]
+                del self.overrides[row]
+                self._dirty.add(section)
+                if not any(self._section_of[other] == section for other in self.overrides):
+                    # last override of the section gone: drop the float drift too
+                    self._total_abs[section] = self._base_total_abs[section]
+                    self._total_post[section] = self._base_total_post[section]
+                    self._gross[section] = self._base_gross[section]
+            return
+
+        self.overrides = {}
+        self._total_abs = self._base_total_abs.copy()
+        self._total_post = self._base_total_post.copy()
+        self._values = {
+            column: self.base[column].to_numpy(dtype=float).copy()
+            for column in WHAT_IF_COLUMNS
+        }
+        self._modes = self.base["Contribution Mode"].to_numpy(dtype=object).copy()
+        self._gross = self._base_gross.copy()
+        self._dirty = set()
+
+    def set_segment(self, row, post=None, absolute_change=None):
+        """
+        Override segment `row` (position in rca_df) with a new Post or a new
+        Absolute Change; the other one moves by the same amount (Pre is
+        fixed). O(1): only its section's aggregates are updated here.
+        """
+        if (post is None) == (absolute_change is None):
+            raise ValueError("Give either post or absolute_change.")
+        values = self._values
+        if post is not None:
+            delta = post - values["Post"][row]
+        else:
+            delta = absolute_change - values["Absolute Change"][row]
+
+        section = self._section_of[row]
+        new_abs = values["Absolute Change"][row] + delta
+        self._gross[section] += abs(new_abs) - abs(values["Absolute Change"][row])
+        self._total_abs[section] += delta
+        self._total_post[section] += delta
+        values["Absolute Change"][row] = new_abs
+        values["Post"][row] += delta
+        pre = self.base.at[row, "Pre"]
+        values["% Change"][row] = new_abs / pre if pre else np.nan
+
+        self.overrides[row] = (values["Post"][row], new_abs)
+        self._dirty.add(section)
+
+    def _refresh(self, section):
+        # same math as compute_rca_for_table, on one section's arrays
+        rows = self._rows[section]
+        values = self._values
+        abs_change = values["Absolute Change"][rows]
+        gross = self._gross[section]
+        total_abs = self._total_abs[section]
+        mode = _resolve_contribution_mode(self.contribution_mode, total_abs, gross)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = abs_change / gross * 100 if gross else np.zeros(len(rows))
+            contribution = share if mode == "gross" else abs_change / total_abs * 100
+            contribution_post = values["Post"][rows] / self._total_post[section] * 100
+        score = np.abs(contribution) + np.abs(contribution_post)
+
+        values["Contribution to Absolute Change (%)"][rows] = contribution
+        values["Contribution to Post (%)"][rows] = contribution_post
+        values["Combined Impact Score"][rows] = score
+        values["RCA Priority"][rows] = pd.Series(score).rank(ascending=False).to_numpy()
+        values["Share of Gross Change (%)"][rows] = share
+        self._modes[rows] = mode
+
+    def frame(self):
+        """
+        The RCA result with the current overrides applied, plus a
+        "What-If Override" flag per segment.
+        """
+        for section in self._dirty:
+            self._refresh(section)
+        self._dirty.clear()
+
+        df = self.base.copy()
+        for column, values in self._values.items():
+            df[column] = values.copy()
+        df["Contribution Mode"] = self._modes.copy()
+        df["What-If Override"] = df.index.isin(list(self.overrides))
+        return df
+
+    def section_summary(self):
+        """
+        Actual vs what-if total change and total Post for every section.
+        """
+        return pd.DataFrame({
+            "Section": self.sections,
+            "Actual Total Change": self._base_total_abs,
+            "What-If Total Change": self._total_abs,
+            "Actual Total Post": self._base_total_post,
+            "What-If Total Post": self._total_post,
+        })
 
 
 # -------------- LABELS --------------
@@ -129,114 +1088,202 @@ def process_rca(tables):
 def add_kpi_label_column(rca_df):
     """
     Add a human-readable KPI Segment Label like "Handset Type: Smartphone".
+    Returns a shallow copy: the existing columns are shared, not copied.
     """
-    rca_df = rca_df.copy()
+    rca_df = rca_df.copy(deep=False)
+    rca_df["KPI Segment Label"] = (
+        rca_df["Section"].map(str) + ": " + _segment_values(rca_df).map(str)
+    )
+    return rca_df
 
-    def get_label(row):
-        section = row["Section"]
-        value = row.get(section, None)
-        return f"{section}: {value}"
 
-    rca_df["KPI Segment Label"] = rca_df.apply(get_label, axis=1)
-    return rca_df
+# -------------- TOP-K SELECTION --------------
+
+
+def _ranked_positions(values, largest=True, sign=None, absolute=False, keep=None):
+    """
+    (positions, ranking keys) of the rows select_top_k / arrow_top_k may
+    pick: NaN and, with `sign`, non-positive / non-negative values dropped;
+    smaller keys rank first.
+    """
+    keep = ~np.isnan(values) if keep is None else keep & ~np.isnan(values)
+    if sign == "positive":
+        keep &= values > 0
+    elif sign == "negative":
+        keep &= values < 0
+    if absolute:
+        values = np.abs(values)
+    positions = np.flatnonzero(keep)
+    ranked = -values[positions] if largest else values[positions]
+    return positions, ranked
+
+
+def _best_k(positions, ranked, k):
+    """
+    The k positions with the smallest keys, best first, ties in row order.
+    """
+    if k <= 0:
+        return positions[:0]
+    if k < len(positions):
+        # the k best by partition; ties at the cut go to the earliest rows
+        cut = np.partition(ranked, k - 1)[k - 1]
+        better = np.flatnonzero(ranked < cut)
+        tied = np.flatnonzero(ranked == cut)[: k - len(better)]
+        chosen = np.concatenate([better, tied])
+        positions, ranked = positions[chosen], ranked[chosen]
+    return positions[np.lexsort((positions, ranked))]
+
+
+def select_top_k(df, column, k, largest=True, by=None, sign=None, absolute=False):
+    """
+    Rows of df with the k largest (or smallest) values of `column`, picked
+    by position (argpartition) instead of sorting the whole frame; the
+    index of df is not used, so duplicate labels are fine.
+
+    - sign: "positive" / "negative" to only consider values > 0 / < 0.
+    - absolute: rank by |value| (e.g. biggest movers either way).
+    - by: a column to pick the top k within each group (e.g. "Section"),
+      all groups in one sorted pass; rows without a group are skipped.
+
+    NaN values are never picked.
+
+    Rows come back best first (within each group when `by` is given), ties
+    in row order (as nlargest / nsmallest keep="first").
+    """
+    values = df[column].to_numpy(dtype=float, na_value=np.nan)
+    if by is None:
+        positions, ranked = _ranked_positions(values, largest, sign, absolute)
+        return df.iloc[_best_k(positions, ranked, k)]
+
+    groups = pd.factorize(df[by])[0]
+    positions, ranked = _ranked_positions(
+        values, largest, sign, absolute, keep=groups >= 0
+    )
+
+    # one lexsort instead of a Python-level nlargest per group: groups in
+    # order of first appearance (among the kept rows), best first, ties in
+    # row order
+    groups = pd.factorize(groups[positions])[0]
+    order = np.lexsort((positions, ranked, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    rank_in_group = np.arange(len(order)) - np.repeat(starts, sizes)
+    return df.iloc[positions[order[rank_in_group < k]]]
+
+
+def _segment_values(rca_df):
+    """
+    Each row's segment name, i.e. the value in the column named by its Section.
+    """
+    values = np.full(len(rca_df), None, dtype=object)
+    for section, positions in rca_df.groupby("Section", sort=False).indices.items():
+        if section in rca_df.columns:
+            values[positions] = rca_df[section].to_numpy()[positions]
+    return pd.Series(values, index=rca_df.index, dtype=object)
+
+
+def _is_multisim_inverted(labels):
+    if CATALOGUE.inverted_pattern is None:
+        return pd.Series(False, index=labels.index)
+    return labels.astype(str).str.contains(CATALOGUE.inverted_pattern, na=False)
 
 
 # -------------- CHARTS (business view for GP/BL Multisim) --------------
 
 
-def plot_rca_drivers(rca_df, top_n=10, output_folder="output_new"):
+CHART_VALUE_COLUMN = "Contribution (business view, %)"
+
+
+def build_driver_chart_data(rca_df, top_n=10, exclude_noise=False):
     """
-    Plot top positive and negative drivers.
+    The data behind the driver charts: (top positive, top negative) frames
+    of top_n rows each with "KPI Segment Label" and CHART_VALUE_COLUMN.
+    A few KB, so the dashboard hands it to a client-side chart instead of
+    rendering images on the server.
 
-    IMPORTANT:
     - Core math (Contribution to Absolute Change) stays as-is.
     - For charts only, GP_MULTISIM and BL_MULTISIM have inverted sign:
         * If users increase (positive), shown as negative driver in charts.
         * If users decrease (negative), shown as positive driver in charts.
+    - exclude_noise leaves out segments score_significance flagged as noise.
     """
-    os.makedirs(output_folder, exist_ok=True)
-
-    # Work on a copy so core RCA math is untouched
-    df_plot = rca_df.copy()
-
-    def invert_for_multisim_chart(row):
-        label = str(row.get("KPI Segment Label", ""))
-
-        # Only apply special logic to GP_MULTISIM and BL_MULTISIM
-        if "GP_MULTISIM" in label or "BL_MULTISIM" in label:
-            return -row["Contribution to Absolute Change (%)"]
-        else:
-            return row["Contribution to Absolute Change (%)"]
-
-    # New column used only for plotting
-    df_plot["Contrib_for_chart"] = df_plot.apply(
-        invert_for_multisim_chart, axis=1
+    if exclude_noise:
+        rca_df = drop_noise(rca_df)
+
+    # Only the two columns the charts need; core RCA frame is untouched
+    contrib = rca_df["Contribution to Absolute Change (%)"]
+    df_plot = pd.DataFrame({
+        "KPI Segment Label": rca_df["KPI Segment Label"],
+        CHART_VALUE_COLUMN: contrib.where(
+            ~_is_multisim_inverted(rca_df["KPI Segment Label"]), -contrib
+        ),
+    })
+
+    pos = select_top_k(df_plot, CHART_VALUE_COLUMN, top_n, sign="positive")
+    neg = select_top_k(
+        df_plot, CHART_VALUE_COLUMN, top_n, largest=False, sign="negative"
     )
+    return pos.reset_index(drop=True), neg.reset_index(drop=True)
 
-    # --------------- TOP POSITIVE DRIVERS (chart view) ---------------
-    pos = df_plot[df_plot["Contrib_for_chart"] > 0]
-    pos = pos.sort_values(
-        "Contrib_for_chart", ascending=False
-    ).head(top_n)
 
+def _save_driver_chart(data, color, title, path):
     plt.figure(figsize=(12, 6))
     plt.bar(
-        pos["KPI Segment Label"],
-        pos["Contrib_for_chart"],
-        color="green",
+        data["KPI Segment Label"],
+        data[CHART_VALUE_COLUMN],
+        color=color,
     )
     plt.xticks(rotation=45, ha="right")
     plt.xlabel("KPI Segment")
     plt.ylabel("Contribution to Absolute Change (%)")
-    plt.title("Top Positive Revenue Drivers (business view)")
+    plt.title(title)
     plt.tight_layout()
-    chart_path_pos = os.path.join(
-        output_folder, "rca_top_positive_drivers.png"
-    )
-    plt.savefig(chart_path_pos, dpi=150)
+    plt.savefig(path, dpi=150)
     plt.close()
 
-    # --------------- TOP NEGATIVE DRIVERS (chart view) ---------------
-    neg = df_plot[df_plot["Contrib_for_chart"] < 0]
-    neg = neg.sort_values(
-        "Contrib_for_chart"
-    ).head(top_n)
 
-    plt.figure(figsize=(12, 6))
-    plt.bar(
-        neg["KPI Segment Label"],
-        neg["Contrib_for_chart"],
-        color="red",
+def plot_rca_drivers(rca_df, top_n=10, output_folder="output_new", exclude_noise=False):
+    """
+    Plot top positive and negative drivers (business view, see
+    build_driver_chart_data) to PNG files, for exports and reports.
+    Returns the two file paths.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    pos, neg = build_driver_chart_data(rca_df, top_n, exclude_noise)
+
+    chart_path_pos = os.path.join(
+        output_folder, "rca_top_positive_drivers.png"
+    )
+    _save_driver_chart(
+        pos, "green", "Top Positive Revenue Drivers (business view)", chart_path_pos
     )
-    plt.xticks(rotation=45, ha="right")
-    plt.xlabel("KPI Segment")
-    plt.ylabel("Contribution to Absolute Change (%)")
-    plt.title("Top Negative Revenue Drivers (business view)")
-    plt.tight_layout()
     chart_path_neg = os.path.join(
         output_folder, "rca_top_negative_drivers.png"
     )
-    plt.savefig(chart_path_neg, dpi=150)
-    plt.close()
-
+    _save_driver_chart(
+        neg, "red", "Top Negative Revenue Drivers (business view)", chart_path_neg
+    )
     return chart_path_pos, chart_path_neg
 
 
 # -------------- NARRATIVE (business view for GP/BL Multisim) --------------
 
 
+NARRATIVE_SECTIONS = CATALOGUE.narrative_sections
+
+
+def _business_sign(row, section_col):
+    return -1 if CATALOGUE.is_inverted(row[section_col]) else 1
+
+
 def _abs_change_business_view(row, section_col):
     """
     For narrative only:
     - GP_MULTISIM / BL_MULTISIM: invert sign (increase = negative, decrease = positive).
     - Others: keep original Absolute Change.
     """
-    label = str(row[section_col])
-    ac = row["Absolute Change"]
-
-    if "GP_MULTISIM" in label or "BL_MULTISIM" in label:
-        return -ac
-    return ac
+    return _business_sign(row, section_col) * row["Absolute Change"]
 
 
 def format_driver_row(row, section_col):
@@ -244,50 +1291,70 @@ def format_driver_row(row, section_col):
     ac_business = _abs_change_business_view(row, section_col)
     pct_change = row["% Change"] * 100
     label = row[section_col]
-    return f"{label} ({ac_business:+,.2f} / {pct_change:+.2f}%)"
+    text = f"{label} ({ac_business:+,.2f} / {pct_change:+.2f}%)"
 
+    # volume / mix / rate split, when decompose_volume_rate_mix was run
+    if pd.notna(row.get("Volume Effect", np.nan)):
+        sign = _business_sign(row, section_col)
+        text += (
+            f" [volume {sign * row['Volume Effect']:+,.0f}, "
+            f"mix {sign * row['Mix Effect']:+,.0f}, "
+            f"rate {sign * row['Rate Effect']:+,.0f}]"
+        )
+    return text
 
-def get_top_drivers_by_section(rca_df, section, top_n_pos=2, top_n_neg=2):
-    df_sec = rca_df[rca_df["Section"] == section].copy()
-    if df_sec.empty:
-        return [], []
 
-    # Add a business-view column just for narrative ranking
-    df_sec["AbsChange_business"] = df_sec.apply(
-        lambda r: _abs_change_business_view(r, section), axis=1
-    )
+def get_top_drivers_all_sections(rca_df, sections, top_n_pos=2, top_n_neg=2):
+    """
+    Top positive / negative drivers of every section in one grouped pass.
+    Returns {section: (pos_list, neg_list)} with formatted driver strings.
+    """
+    df_sec = rca_df[rca_df["Section"].isin(sections)]
+    ac = df_sec["Absolute Change"].to_numpy()
+    # positional index: rows are looked up with iloc below, so duplicate
+    # labels in rca_df (e.g. from a plain pd.concat) do not matter
+    ranking = pd.DataFrame({
+        "Section": df_sec["Section"].to_numpy(),
+        # business-view Absolute Change, just for narrative ranking
+        "AbsChange_business": np.where(
+            _is_multisim_inverted(_segment_values(df_sec)).to_numpy(), -ac, ac
+        ),
+    })
 
     # Positive: largest business-view Absolute Change
-    pos = df_sec.sort_values("AbsChange_business", ascending=False).head(top_n_pos)
-
+    pos = select_top_k(ranking, "AbsChange_business", top_n_pos, by="Section")
     # Negative: smallest business-view Absolute Change
-    neg = df_sec.sort_values("AbsChange_business", ascending=True).head(top_n_neg)
-
-    pos_list = [format_driver_row(r, section) for _, r in pos.iterrows()]
-    neg_list = [format_driver_row(r, section) for _, r in neg.iterrows()]
-    return pos_list, neg_list
-
-
-def generate_structured_rca_text(rca_df, brand_name="Brand"):
-    sections_to_use = [
-        "Handset Type",
-        "Arpu Segment",
-        "Usage Category",
-        "Gb Slab",
-        "Base Type",
-        "Multisimmer",
-        "Clustername",
-        "Mou Slab",
-        "Aon Bucket",
-        "Vc User Category",
-    ]
+    neg = select_top_k(
+        ranking, "AbsChange_business", top_n_neg, largest=False, by="Section"
+    )
+
+    drivers = {}
+    for section in sections:
+        pos_idx = pos.index[pos["Section"] == section]
+        neg_idx = neg.index[neg["Section"] == section]
+        drivers[section] = (
+            [format_driver_row(df_sec.iloc[i], section) for i in pos_idx],
+            [format_driver_row(df_sec.iloc[i], section) for i in neg_idx],
+        )
+    return drivers
+
+
+def get_top_drivers_by_section(rca_df, section, top_n_pos=2, top_n_neg=2):
+    return get_top_drivers_all_sections(
+        rca_df, [section], top_n_pos=top_n_pos, top_n_neg=top_n_neg
+    )[section]
 
+
+def render_rca_text(drivers, brand_name="Brand", sections=NARRATIVE_SECTIONS):
+    """
+    Narrative text from {section: (pos_list, neg_list)} driver strings.
+    """
     lines = []
     lines.append(f"{brand_name}: Key change drivers")
     lines.append("")
     lines.append("Biggest positive impact:")
-    for sec in sections_to_use:
-        pos, _ = get_top_drivers_by_section(rca_df, sec)
+    for sec in sections:
+        pos, _ = drivers.get(sec, ([], []))
         if pos:
             lines.append(f"- {sec}:")
             for item in pos:
@@ -295,8 +1362,8 @@ def generate_structured_rca_text(rca_df, brand_name="Brand"):
 
     lines.append("")
     lines.append("Negative impacts / areas to watch:")
-    for sec in sections_to_use:
-        _, neg = get_top_drivers_by_section(rca_df, sec)
+    for sec in sections:
+        _, neg = drivers.get(sec, ([], []))
         if neg:
             lines.append(f"- {sec}:")
             for item in neg:
@@ -305,6 +1372,14 @@ def generate_structured_rca_text(rca_df, brand_name="Brand"):
     return "\n".join(lines)
 
 
+def generate_structured_rca_text(rca_df, brand_name="Brand", exclude_noise=False):
+    if exclude_noise:
+        rca_df = drop_noise(rca_df)
+    sections_to_use = NARRATIVE_SECTIONS
+    drivers = get_top_drivers_all_sections(rca_df, sections_to_use)
+    return render_rca_text(drivers, brand_name, sections_to_use)
+
+
 def save_rca_text(text, output_folder="output_new", filename="rca_insights.txt"):
     os.makedirs(output_folder, exist_ok=True)
     path = os.path.join(output_folder, filename)
@@ -313,6 +1388,278 @@ def save_rca_text(text, output_folder="output_new", filename="rca_insights.txt")
     return path
 
 
+def generate_rca_texts(rca_df, by="Brand", exclude_noise=False, sections=NARRATIVE_SECTIONS):
+    """
+    Narratives of every brand of a combined multi-brand RCA frame in one
+    grouped pass: {name: text}, each text equal to
+    generate_structured_rca_text on that brand's rows alone.
+
+    by is the brand column, or a list of columns (e.g. ["Brand", "Circle"])
+    whose values are joined with " / " into the name used in the text.
+    """
+    if exclude_noise:
+        rca_df = drop_noise(rca_df)
+    keys = [by] if isinstance(by, str) else list(by)
+    names = rca_df[keys[0]].astype(str)
+    for key in keys[1:]:
+        names = names + " / " + rca_df[key].astype(str)
+
+    in_sections = rca_df["Section"].isin(sections).to_numpy()
+    df_sec = rca_df[in_sections]
+    ac = df_sec["Absolute Change"].to_numpy()
+    # positional index throughout, so a multi-brand frame from a plain
+    # pd.concat (duplicate labels) works
+    ranking = pd.DataFrame({
+        "Name": names.to_numpy()[in_sections],
+        "Section": df_sec["Section"].to_numpy(),
+        # business-view Absolute Change, just for narrative ranking
+        "AbsChange_business": np.where(
+            _is_multisim_inverted(_segment_values(df_sec)).to_numpy(), -ac, ac
+        ),
+    })
+    ranking["Group"] = ranking.groupby(["Name", "Section"], sort=False).ngroup()
+
+    pos = select_top_k(ranking, "AbsChange_business", 2, by="Group")
+    neg = select_top_k(ranking, "AbsChange_business", 2, largest=False, by="Group")
+
+    # plain dict rows of just the columns format_driver_row reads: row
+    # lookups on the wide mixed-type frame would dominate otherwise
+    picked = pos.index.union(neg.index)
+    columns = [
+        col for col in rca_df.columns
+        if col in set(sections)
+        or col in ("Absolute Change", "% Change", "Volume Effect", "Mix Effect", "Rate Effect")
+    ]
+    rows = dict(zip(picked, df_sec[columns].iloc[picked].to_dict("records")))
+
+    drivers = {}
+    for side, picked in enumerate([pos, neg]):
+        for i, name, section in zip(picked.index, picked["Name"], picked["Section"]):
+            lists = drivers.setdefault(name, {}).setdefault(section, ([], []))
+            lists[side].append(format_driver_row(rows[i], section))
+
+    return {
+        name: render_rca_text(drivers.get(name, {}), name, sections)
+        for name in pd.unique(names)
+    }
+
+
+def _archive_names(names, max_len, invalid):
+    # file / sheet safe, unique names for the archive entries
+    used, safe = set(), []
+    for name in names:
+        base = "".join("_" if ch in invalid else ch for ch in str(name))[:max_len] or "_"
+        candidate, n = base, 1
+        while candidate.lower() in used:
+            n += 1
+            suffix = f"~{n}"
+            candidate = base[:max_len - len(suffix)] + suffix
+        used.add(candidate.lower())
+        safe.append(candidate)
+    return safe
+
+
+def write_rca_report_archive(texts, path, fmt=None):
+    """
+    Write {name: text} narratives (see generate_rca_texts) into one indexed
+    archive:
+    - "zip": one <name>.txt per brand plus index.csv;
+    - "xlsx": an "Index" sheet plus one sheet per brand, one text line
+      per row.
+    fmt defaults to the extension of path. The archive is built in memory
+    and written to disk in one go. Returns the index as a DataFrame.
+    """
+    fmt = fmt or os.path.splitext(path)[1].lower().lstrip(".")
+    names = list(texts)
+    lines = [texts[name].split("\n") for name in names]
+
+    buffer = BytesIO()
+    if fmt == "zip":
+        files = [f"{safe}.txt" for safe in _archive_names(names, 100, '<>:"/\\|?*')]
+        index = pd.DataFrame({"Name": names, "File": files, "Lines": map(len, lines)})
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("index.csv", index.to_csv(index=False))
+            for file_name, name in zip(files, names):
+                archive.writestr(file_name, texts[name])
+    elif fmt == "xlsx":
+        # Excel sheet names: 31 characters, no []:*?/\, "Index" is taken
+        sheets = _archive_names(["Index"] + names, 31, "[]:*?/\\")[1:]
+        index = pd.DataFrame({"Name": names, "Sheet": sheets, "Lines": map(len, lines)})
+        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+            index.to_excel(writer, sheet_name="Index", index=False)
+            for sheet, text_lines in zip(sheets, lines):
+                pd.DataFrame({"RCA Narrative": text_lines}).to_excel(
+                    writer, sheet_name=sheet, index=False
+                )
+    else:
+        raise ValueError(f"Unknown report archive format: {fmt!r} (use zip or xlsx)")
+
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
+    return index
+
+
+# -------------- ARROW HANDOFF --------------
+
+
+def rca_to_arrow(rca_df):
+    """
+    Convert an RCA result to an Arrow table, the form later stages (UI,
+    downloads, comparison, HTTP service) consume.
+    Column names become strings and segment columns that mix text and
+    numbers are stored as text, which Arrow needs.
+    """
+    df = rca_df.copy(deep=False)
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(
+            df[col], skipna=True
+        ).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def arrow_project(table, columns, rename=None):
+    """
+    Zero-copy projection of an Arrow table onto `columns`, optionally
+    renamed with a {old: new} mapping. Only buffer references are copied.
+    """
+    projected = table.select(columns)
+    if rename:
+        projected = projected.rename_columns(
+            [rename.get(col, col) for col in projected.column_names]
+        )
+    return projected
+
+
+def arrow_top_k(table, column, k, largest=True, sign=None, absolute=False):
+    """
+    Arrow counterpart of select_top_k: the k rows with the largest (or
+    smallest) values of `column`, optionally only positive / negative ones
+    or ranked by |value|. Null / NaN values are never picked and ties keep
+    row order, so both pick the same rows. Found with a partition and
+    gathered with take(), so only k rows are materialised.
+    """
+    values = pc.cast(table[column], pa.float64()).to_numpy(zero_copy_only=False)
+    positions, ranked = _ranked_positions(values, largest, sign, absolute)
+    return table.take(_best_k(positions, ranked, k))
+
+
+def arrow_to_parquet_bytes(table):
+    buf = pa.BufferOutputStream()
+    pq.write_table(table, buf)
+    return buf.getvalue().to_pybytes()
+
+
+def arrow_to_ipc_bytes(table):
+    buf = pa.BufferOutputStream()
+    with pa.ipc.new_stream(buf, table.schema) as writer:
+        writer.write_table(table)
+    return buf.getvalue().to_pybytes()
+
+
+def compare_rca_tables(table_a, table_b):
+    """
+    Compare two labelled RCA results (Arrow tables) entirely in Arrow:
+    project the core columns, full outer join on Section + KPI Segment
+    Label and compute the A - B deltas (missing side counted as 0).
+    """
+    metrics = {
+        "Absolute Change": "AbsChange",
+        "Contribution to Absolute Change (%)": "ContribAbs",
+        "Contribution to Post (%)": "ContribPost",
+    }
+    keys = ["Key", "Section", "KPI Segment Label"]
+
+    def core(table, suffix):
+        key = pc.binary_join_element_wise(
+            pc.cast(table["Section"], pa.string()),
+            pc.cast(table["KPI Segment Label"], pa.string()),
+            " | ",
+        )
+        projected = arrow_project(
+            table,
+            ["Section", "KPI Segment Label"] + list(metrics),
+            rename={col: f"{short}_{suffix}" for col, short in metrics.items()},
+        )
+        return projected.add_column(0, "Key", key)
+
+    cmp_table = core(table_a, "A").join(
+        core(table_b, "B"), keys=keys, join_type="full outer"
+    )
+    for short in metrics.values():
+        cmp_table = cmp_table.append_column(
+            f"Delta_{short}",
+            pc.subtract(
+                pc.fill_null(cmp_table[f"{short}_A"], 0.0),
+                pc.fill_null(cmp_table[f"{short}_B"], 0.0),
+            ),
+        )
+
+    ordered = keys + [
+        f"{short}_{suffix}" for suffix in ("A", "B") for short in metrics.values()
+    ] + [f"Delta_{short}" for short in metrics.values()]
+    return cmp_table.select(ordered)
+
+
+# -------------- RESULTS BROWSER --------------
+
+
+def filter_rca_table(table, sections=None, search=None, label_column="KPI Segment Label"):
+    """
+    Rows of an Arrow RCA / comparison table in `sections` whose segment
+    label contains `search` (case-insensitive). Both filters are optional.
+    """
+    mask = None
+    if sections:
+        mask = pc.is_in(
+            pc.cast(table["Section"], pa.string()),
+            value_set=pa.array([str(sec) for sec in sections], pa.string()),
+        )
+    if search:
+        found = pc.fill_null(
+            pc.match_substring(
+                pc.cast(table[label_column], pa.string()), search, ignore_case=True
+            ),
+            False,
+        )
+        mask = found if mask is None else pc.and_(mask, found)
+    return table if mask is None else table.filter(mask)
+
+
+def sort_rca_table(table, column, ascending=False):
+    """
+    Arrow sort on one column; nulls go last either way.
+    """
+    if column is None:
+        return table
+    return table.sort_by([(column, "ascending" if ascending else "descending")])
+
+
+def page_rca_table(table, page, page_size):
+    """
+    One page (1-based) of an Arrow table as a zero-copy slice, plus the
+    number of pages. Out-of-range pages are clamped.
+    """
+    n_pages = max(1, -(-table.num_rows // page_size))
+    page = min(max(page, 1), n_pages)
+    return table.slice((page - 1) * page_size, page_size), n_pages
+
+
+def higher_value_styles(df, col_a, col_b, style="color: green"):
+    """
+    CSS for Styler.apply(..., axis=None): `style` on whichever of col_a /
+    col_b is higher in each row (ties go to col_a). Built from column masks
+    rather than a per-row callback.
+    """
+    a = df[col_a].to_numpy(dtype=float, na_value=np.nan)
+    b = df[col_b].to_numpy(dtype=float, na_value=np.nan)
+    styles = pd.DataFrame("", index=df.index, columns=df.columns)
+    styles[col_a] = np.where(a >= b, style, "")
+    styles[col_b] = np.where(b > a, style, "")
+    return styles
+
+
 # -------------- MAIN (for local testing) --------------
 
 
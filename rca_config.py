@@ -0,0 +1,163 @@
+"""
+Section catalogue of the RCA pipeline, loaded from rca_config.toml.
+
+The TOML file describes the known sections (narrative order, aliases), the
+totals-row marker, the metric columns and the business-view sign rules.
+load_catalogue() reads it once and compiles it into lookup tables (alias
+dicts, sets, one regex) that rca_agent_new uses everywhere, so a new
+operator layout is a config edit and matching stays a dict / set lookup
+per distinct header instead of string checks per row.
+
+The file is found through the RCA_CONFIG environment variable, else
+rca_config.toml next to this module; without it the built-in defaults
+below (the same as the shipped file) are used.
+"""
+import os
+import re
+import warnings
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rca_config.toml")
+
+DEFAULT_CONFIG = {
+    "layout": {"totals_markers": ["X"], "brand_header": "Brand"},
+    "metrics": {
+        "columns": ["Pre", "Post", "Absolute Change", "% Change"],
+        "required": ["Pre", "Post", "Absolute Change"],
+        "aliases": {},
+    },
+    "business_view": {"inverted_segments": ["GP_MULTISIM", "BL_MULTISIM"]},
+    "sections": [
+        {"name": name}
+        for name in [
+            "Handset Type",
+            "Arpu Segment",
+            "Usage Category",
+            "Gb Slab",
+            "Base Type",
+            "Multisimmer",
+            "Clustername",
+            "Mou Slab",
+            "Aon Bucket",
+            "Vc User Category",
+        ]
+    ],
+}
+
+
+# -------------- CATALOGUE --------------
+
+
+class SectionCatalogue:
+    """
+    A config (dict as in rca_config.toml) compiled into lookups:
+
+    - sections / narrative_sections: section names, in narrative order;
+    - section_aliases: {alias: section name};
+    - metric_columns, required_metrics, metric_aliases ({alias: metric});
+    - totals_markers, brand_header;
+    - inverted_segments and inverted_pattern, one regex matching any of
+      them (None when the list is empty).
+    """
+
+    def __init__(self, config):
+        layout = config.get("layout", {})
+        metrics = config.get("metrics", {})
+        business_view = config.get("business_view", {})
+        sections = config.get("sections", [])
+
+        self.totals_markers = tuple(layout.get("totals_markers", ["X"]))
+        self.brand_header = layout.get("brand_header", "Brand")
+
+        self.metric_columns = tuple(metrics.get("columns", DEFAULT_CONFIG["metrics"]["columns"]))
+        self.required_metrics = frozenset(
+            metrics.get("required", DEFAULT_CONFIG["metrics"]["required"])
+        )
+        unknown = self.required_metrics.difference(self.metric_columns)
+        if unknown:
+            raise ValueError(f"Required metrics not in metrics.columns: {sorted(unknown)}")
+        self.metric_aliases = dict(metrics.get("aliases", {}))
+        bad = {alias: name for alias, name in self.metric_aliases.items()
+               if name not in self.metric_columns}
+        if bad:
+            raise ValueError(f"Metric aliases point to unknown metrics: {bad}")
+
+        self.sections = []
+        self.narrative_sections = []
+        self.section_aliases = {}
+        for entry in sections:
+            if "name" not in entry:
+                raise ValueError(f"Section entry without a name: {entry}")
+            name = entry["name"]
+            self.sections.append(name)
+            if entry.get("narrative", True):
+                self.narrative_sections.append(name)
+            for alias in entry.get("aliases", []):
+                if self.section_aliases.get(alias, name) != name:
+                    raise ValueError(f"Section alias {alias!r} is used by two sections")
+                self.section_aliases[alias] = name
+
+        self.inverted_segments = tuple(business_view.get("inverted_segments", []))
+        self.inverted_pattern = (
+            re.compile("|".join(map(re.escape, self.inverted_segments)))
+            if self.inverted_segments else None
+        )
+
+    def canonical_column(self, name):
+        """
+        A column name of a long table with metric and section (dimension)
+        aliases replaced by their canonical names.
+        """
+        name = self.metric_aliases.get(name, name)
+        return self.section_aliases.get(name, name)
+
+    def canonical_header(self, header):
+        """
+        A section header row (tuple of names) with the section alias
+        (first cell) and metric aliases replaced by their canonical names.
+        """
+        if not header:
+            return header
+        first = self.section_aliases.get(header[0], header[0])
+        return (first,) + tuple(self.metric_aliases.get(name, name) for name in header[1:])
+
+    def is_inverted(self, label):
+        return self.inverted_pattern is not None and bool(
+            self.inverted_pattern.search(str(label))
+        )
+
+
+def load_catalogue(path=None):
+    """
+    SectionCatalogue from `path`, else $RCA_CONFIG, else rca_config.toml
+    next to this module; the built-in defaults when no file is found. A
+    file that exists but cannot be read (no TOML parser) raises when it was
+    asked for and warns otherwise.
+    """
+    path = path or os.environ.get("RCA_CONFIG")
+    explicit = path is not None
+    path = path or CONFIG_FILE
+
+    if not os.path.exists(path):
+        if explicit:
+            raise FileNotFoundError(f"RCA config not found: {path}")
+        return SectionCatalogue(DEFAULT_CONFIG)
+    if tomllib is None:
+        message = f"Reading the RCA config {path} needs Python 3.11+ or the tomli package."
+        if explicit:
+            raise ImportError(message)
+        # the shipped file matches the defaults, but an edited one would be
+        # ignored without a word
+        warnings.warn(f"{message} Using the built-in defaults.", RuntimeWarning, stacklevel=2)
+        return SectionCatalogue(DEFAULT_CONFIG)
+
+    with open(path, "rb") as f:
+        return SectionCatalogue(tomllib.load(f))
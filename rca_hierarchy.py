@@ -0,0 +1,375 @@
+"""
+Hierarchical (drill-down) RCA over long segment data.
+
+The blank-row sections of the standard workbook are one-dimensional. A long
+sheet instead has one row per cell of several dimensions, e.g.
+
+    Clustername | Handset Type | Arpu Segment | Pre | Post
+
+HierarchicalRca answers "which cluster x handset x ARPU cell drove the
+change" for a user-chosen order of those dimensions: every level is a
+grouped rollup of the level below it, and children of a node are only
+turned into RCA rows when that node is expanded.
+
+search_driver_combinations instead looks for the slices (pairs, triples of
+dimension values) that explain most of the change, without a fixed order.
+"""
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from rca_agent_new import (
+    _to_numeric_columns,
+    _is_multisim_inverted,
+    CATALOGUE,
+    METRIC_COLUMNS,
+    NEAR_ZERO_TOTAL_RATIO,
+    _segment_values,
+    compute_rca_for_table,
+    detect_input_format,
+    excel_engine,
+    get_top_drivers_all_sections,
+    render_rca_text,
+)
+
+
+BLANK_SEGMENT = "(blank)"
+PATH_SEPARATOR = " > "
+
+
+# -------------- LONG DATA LOADING --------------
+
+
+def prepare_long_table(df):
+    """
+    Clean a long table (header row already applied): metric and dimension
+    column aliases of the section catalogue resolved, numeric metrics,
+    Absolute Change derived from Pre / Post when missing, dimension values
+    as text. Returns (table, dimension columns).
+    """
+    df = df.copy()
+    df.columns = [CATALOGUE.canonical_column(str(col).strip()) for col in df.columns]
+    missing = [col for col in ["Pre", "Post"] if col not in df.columns]
+    if missing:
+        raise ValueError(f"Long RCA sheet needs columns: {', '.join(missing)}")
+
+    df = _to_numeric_columns(df)
+    if "Absolute Change" not in df.columns:
+        df["Absolute Change"] = df["Post"] - df["Pre"]
+
+    dims = [col for col in df.columns if col not in METRIC_COLUMNS]
+    for dim in dims:
+        df[dim] = df[dim].astype(str).where(df[dim].notna(), BLANK_SEGMENT)
+
+    df = df[df["Pre"].notna() | df["Post"].notna()].reset_index(drop=True)
+    return df, dims
+
+
+def read_long_table(file_path, sheet_name=0):
+    """
+    Read a long sheet (first row = header) from a path or file-like object:
+    an Excel workbook, a CSV or a Parquet export (see detect_input_format).
+    Returns (table, dimension columns).
+    """
+    fmt = detect_input_format(file_path)
+    if fmt == "csv":
+        df = pd.read_csv(file_path)
+    elif fmt == "parquet":
+        df = pd.read_parquet(file_path)
+    else:
+        df = pd.read_excel(file_path, sheet_name=sheet_name, engine=excel_engine(fmt))
+    return prepare_long_table(df)
+
+
+# -------------- HIERARCHICAL RCA --------------
+
+
+class HierarchicalRca:
+    """
+    Drill-down RCA over `hierarchy`, an ordered list of dimension columns.
+
+    Dimension values are factorised once; the deepest level is a single
+    grouped sum, and each level above is rolled up from the one below (so
+    never from the raw rows again). Levels and expanded nodes are cached.
+
+    Contributions are against the overall totals, like the flat RCA, plus
+    "Contribution to Parent Change (%)" against the node being expanded.
+    """
+
+    def __init__(self, df, hierarchy):
+        if not hierarchy:
+            raise ValueError("hierarchy needs at least one dimension")
+        self.hierarchy = list(hierarchy)
+
+        codes = {}
+        self._uniques = []
+        for dim in self.hierarchy:
+            dim_codes, uniques = pd.factorize(df[dim], sort=True)
+            codes[dim] = dim_codes
+            self._uniques.append(pd.Index(uniques))
+
+        leaf = pd.DataFrame(codes)
+        for col in ["Pre", "Post", "Absolute Change"]:
+            leaf[col] = df[col].to_numpy(dtype=float, na_value=np.nan)
+
+        self._levels = {
+            len(self.hierarchy): leaf.groupby(self.hierarchy, sort=True)[
+                ["Pre", "Post", "Absolute Change"]
+            ].sum(min_count=1)
+        }
+        self._expanded = {}
+
+        self.totals = pd.Series({
+            "Total Absolute Change": leaf["Absolute Change"].sum(),
+            "Total Post": leaf["Post"].sum(),
+        })
+
+    def level(self, depth):
+        """
+        Rollup at `depth` (1 = first dimension only), indexed by the codes
+        of the first `depth` dimensions.
+        """
+        if depth not in self._levels:
+            below = self.level(depth + 1)
+            self._levels[depth] = below.groupby(
+                level=list(range(depth)), sort=True
+            ).sum(min_count=1)
+        return self._levels[depth]
+
+    def _codes(self, path):
+        codes = []
+        for uniques, value in zip(self._uniques, path):
+            pos = uniques.get_indexer([value])[0]
+            if pos < 0:
+                raise KeyError(f"{value!r} not found in {self.hierarchy[len(codes)]}")
+            codes.append(pos)
+        return tuple(codes)
+
+    def children(self, path=()):
+        """
+        RCA rows for the children of the node at `path` (a tuple of segment
+        values, one per hierarchy level; () is the top). The first column is
+        the child dimension, so add_kpi_label_column works on the result.
+        """
+        path = tuple(path)
+        if path in self._expanded:
+            return self._expanded[path]
+
+        depth = len(path) + 1
+        if depth > len(self.hierarchy):
+            raise ValueError("Path is already at the deepest level of the hierarchy")
+
+        rollup = self.level(depth)
+        if path:
+            # sorted MultiIndex: a prefix lookup, not a scan of the level
+            rollup = rollup.loc[self._codes(path)]
+        child_codes = rollup.index.get_level_values(-1)
+
+        dim = self.hierarchy[depth - 1]
+        table = pd.DataFrame({dim: self._uniques[depth - 1][child_codes]})
+        for parent_dim, value in zip(self.hierarchy, path):
+            table[parent_dim] = value
+        for col in ["Pre", "Post", "Absolute Change"]:
+            table[col] = rollup[col].to_numpy()
+        table["% Change"] = table["Absolute Change"] / table["Pre"].where(
+            table["Pre"] != 0
+        )
+
+        rca = compute_rca_for_table(table, totals=self.totals, total_marker=None)
+        parent_change = rca["Absolute Change"].sum()
+        rca["Contribution to Parent Change (%)"] = (
+            rca["Absolute Change"] / parent_change * 100 if parent_change else np.nan
+        )
+        rca["Level"] = depth
+        rca["Path"] = [
+            PATH_SEPARATOR.join(path + (segment,)) for segment in rca[dim].astype(str)
+        ]
+
+        self._expanded[path] = rca.reset_index(drop=True)
+        return self._expanded[path]
+
+    def drill_down(self, path=(), max_depth=None):
+        """
+        Follow the biggest |Absolute Change| child from `path` down to
+        `max_depth` (default: the deepest level). Returns one row per level,
+        the chain of cells that explains most of the change.
+        """
+        max_depth = max_depth or len(self.hierarchy)
+        path = tuple(path)
+        chain = []
+        while len(path) < max_depth:
+            rows = self.children(path)
+            if rows.empty:
+                break
+            top = rows.loc[rows["Absolute Change"].abs().idxmax()]
+            chain.append(top)
+            path = path + (top[self.hierarchy[len(path)]],)
+        return pd.DataFrame(chain).reset_index(drop=True)
+
+
+# -------------- MULTI-DIMENSIONAL DRIVER SEARCH --------------
+
+
+COMBINATION_SEPARATOR = " × "
+SLICE_SEPARATOR = " / "
+
+
+def _slice_keys(codes, cards, combo):
+    """
+    One int64 key per row for the cells of `combo` (mixed-radix codes).
+    """
+    keys = np.zeros(len(codes[combo[0]]), dtype=np.int64)
+    for dim in combo:
+        keys = keys * cards[dim] + codes[dim]
+    return keys
+
+
+def _decode_slice_keys(keys, cards, combo):
+    decoded = {}
+    for dim in reversed(combo):
+        keys, decoded[dim] = np.divmod(keys, cards[dim])
+    return decoded
+
+
+def _surprise(pre_share, post_share):
+    """
+    Jensen-Shannon style surprise of a slice's share moving from pre_share
+    to post_share (as in Adtributor): 0 when the share did not move.
+    """
+    mean = (pre_share + post_share) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(pre_share > 0, pre_share * np.log(pre_share / mean), 0.0)
+        terms += np.where(post_share > 0, post_share * np.log(post_share / mean), 0.0)
+    return terms / 2
+
+
+def search_driver_combinations(df, dimensions, max_order=3, min_contribution=5.0,
+                               max_results=None):
+    """
+    Slices of one, two, ... max_order dimensions (e.g. Clustername ×
+    Handset Type = C1 / Smartphone) whose Absolute Change explains at
+    least `min_contribution` % of the total change.
+
+    Apriori-style pruning: a slice's gross movement (sum of |row change|)
+    can only shrink when another dimension is added, so slices whose gross
+    movement is under the threshold are dropped together with every
+    combination built on them. Each candidate combination is one
+    vectorized group-by (factorised keys + bincount) over surviving rows.
+
+    Returns RCA-format rows, one "section" per dimension combination: the
+    first column of each section is named after the combination and holds
+    the slice label, so add_kpi_label_column, RCA Priority and the
+    narrative helpers work on it unchanged. Sorted by |contribution|,
+    simpler slices first on ties.
+
+    When the total change is near zero (ups and downs cancel out, see
+    NEAR_ZERO_TOTAL_RATIO), min_contribution is taken against the total
+    gross movement instead, so pruning still works; with no movement at
+    all nothing is returned.
+    """
+    codes, cards, uniques = {}, {}, {}
+    for dim in dimensions:
+        codes[dim], uniques[dim] = pd.factorize(df[dim], sort=True)
+        cards[dim] = max(len(uniques[dim]), 1)
+
+    metrics = {
+        col: np.nan_to_num(df[col].to_numpy(dtype=float, na_value=np.nan))
+        for col in ["Pre", "Post", "Absolute Change"]
+    }
+    gross = np.abs(metrics["Absolute Change"])
+    totals = pd.Series({
+        "Total Absolute Change": metrics["Absolute Change"].sum(),
+        "Total Post": metrics["Post"].sum(),
+    })
+    total_pre = metrics["Pre"].sum()
+    total_gross = gross.sum()
+    if not total_gross:
+        return pd.DataFrame()
+    reference_change = abs(totals["Total Absolute Change"])
+    if reference_change < NEAR_ZERO_TOTAL_RATIO * total_gross:
+        reference_change = total_gross
+    threshold = reference_change * min_contribution / 100
+
+    survivors = {}
+    sections = []
+    for order in range(1, max_order + 1):
+        for combo in combinations(dimensions, order):
+            subsets = list(combinations(combo, order - 1)) if order > 1 else []
+            if any(sub not in survivors for sub in subsets):
+                continue
+
+            mask = np.ones(len(gross), dtype=bool)
+            for sub in subsets:
+                mask &= np.isin(_slice_keys(codes, cards, sub), survivors[sub])
+            if not mask.any():
+                continue
+
+            slot, slice_keys = pd.factorize(_slice_keys(codes, cards, combo)[mask])
+            slice_gross = np.bincount(slot, weights=gross[mask])
+            keep = slice_gross >= threshold
+            if not keep.any():
+                continue
+            survivors[combo] = slice_keys[keep]
+
+            sums = {
+                col: np.bincount(slot, weights=values[mask])[keep]
+                for col, values in metrics.items()
+            }
+            explains = np.abs(sums["Absolute Change"]) >= threshold
+            if not explains.any():
+                continue
+
+            decoded = _decode_slice_keys(np.asarray(slice_keys[keep])[explains], cards, combo)
+            labels = [uniques[dim][decoded[dim]].astype(str) for dim in combo]
+            section = COMBINATION_SEPARATOR.join(combo)
+
+            table = pd.DataFrame({section: pd.Series(labels[0])})
+            for label in labels[1:]:
+                table[section] = table[section] + SLICE_SEPARATOR + label
+            for dim, label in zip(combo, labels):
+                if dim != section:
+                    table[dim] = label
+            for col, values in sums.items():
+                table[col] = values[explains]
+            table["% Change"] = table["Absolute Change"] / table["Pre"].where(
+                table["Pre"] != 0
+            )
+
+            rca = compute_rca_for_table(table, totals=totals, total_marker=None)
+            rca["Order"] = order
+            rca["Surprise"] = _surprise(
+                rca["Pre"].to_numpy() / total_pre if total_pre else 0.0,
+                rca["Post"].to_numpy() / totals["Total Post"] if totals["Total Post"] else 0.0,
+            )
+            sections.append(rca)
+
+    if not sections:
+        return pd.DataFrame()
+
+    result = pd.concat(sections, ignore_index=True)
+    result["Explanatory Power"] = result["Contribution to Absolute Change (%)"].abs()
+    result = result.sort_values(
+        ["Explanatory Power", "Order"], ascending=[False, True], kind="stable"
+    ).reset_index(drop=True)
+    if max_results is not None:
+        result = result.head(max_results)
+    return result
+
+
+def generate_combination_rca_text(combos, brand_name="Brand", max_sections=5):
+    """
+    Narrative for search_driver_combinations output, in the same layout as
+    generate_structured_rca_text, over the `max_sections` dimension
+    combinations that explain the most change.
+    """
+    sections = list(dict.fromkeys(combos["Section"]))[:max_sections]
+
+    # a combination often has a single explaining slice, so split by
+    # business-view sign first instead of listing it on both sides
+    change = combos["Absolute Change"]
+    business = change.where(~_is_multisim_inverted(_segment_values(combos)), -change)
+    pos = get_top_drivers_all_sections(combos[business > 0], sections)
+    neg = get_top_drivers_all_sections(combos[business < 0], sections)
+    drivers = {sec: (pos[sec][0], neg[sec][1]) for sec in sections}
+    return render_rca_text(drivers, brand_name, sections)
@@ -0,0 +1,435 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from rca_agent_new import (
+    WorkbookSession,
+    read_multiple_tables,
+    process_rca,
+    add_kpi_label_column,
+    find_brand_total,
+    reconcile_section_totals,
+    decompose_volume_rate_mix,
+    stack_history,
+    score_significance,
+    generate_structured_rca_text,
+    save_rca_text,
+    rca_to_arrow,
+    compare_rca_tables,
+)
+
+
+# -------------- JOB MODEL --------------
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job once the user has asked to cancel it.
+    """
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when the runner already holds its maximum number of jobs.
+    """
+
+
+class RcaJob:
+    """
+    State of one background RCA run: current stage, progress, result or error.
+
+    The worker thread writes these attributes; the Streamlit script only reads
+    them on each rerun, so plain attributes are enough here.
+    """
+
+    def __init__(self, stages):
+        self.id = uuid.uuid4().hex
+        self.stages = list(stages)
+        self.stage = "Queued"
+        self.stage_index = -1
+        self.progress = 0.0
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def set_stage(self, name):
+        """
+        Move to the next named stage. Also a cancellation point.
+        """
+        self.check_cancelled()
+        self.stage = name
+        if name in self.stages:
+            self.stage_index = self.stages.index(name)
+        self.progress = max(self.stage_index, 0) / max(len(self.stages), 1)
+
+    def stage_progress(self, done, total):
+        """
+        Report progress inside the current stage (e.g. tables processed).
+        Used as the process_rca progress callback, so it also checks for
+        cancellation between tables.
+        """
+        self.check_cancelled()
+        n_stages = max(len(self.stages), 1)
+        base = max(self.stage_index, 0) / n_stages
+        frac = done / total if total else 1.0
+        self.progress = base + frac / n_stages
+
+    def describe(self):
+        if self.status == "queued":
+            return "Waiting for a free worker..."
+        if self.stage_index >= 0:
+            return f"{self.stage} ({self.stage_index + 1}/{len(self.stages)})"
+        return self.stage
+
+
+# -------------- RUNNER --------------
+
+
+class RcaJobRunner:
+    """
+    Bounded background runner for heavy RCA jobs.
+
+    - At most `max_workers` jobs run at the same time on this server.
+    - At most `max_queued` more jobs may wait; beyond that submit() raises
+      JobQueueFull instead of piling work up behind one huge upload.
+    """
+
+    def __init__(self, max_workers=2, max_queued=8, keep_finished_for=3600):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.keep_finished_for = keep_finished_for
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="rca-job"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, stages=(), **kwargs):
+        """
+        Queue `func(job, *args, **kwargs)` and return its RcaJob.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull(
+                "Too many RCA jobs are running on this server, please retry shortly."
+            )
+
+        job = RcaJob(stages)
+        with self._lock:
+            self._prune_finished()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        try:
+            job.check_cancelled()
+            job.status = "running"
+            job.result = func(job, *args, **kwargs)
+            job.progress = 1.0
+            job.stage = "Done"
+            job.status = "done"
+        except JobCancelled:
+            job.stage = "Cancelled"
+            job.status = "cancelled"
+        except Exception as exc:
+            job.error = exc
+            job.stage = "Failed"
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._slots.release()
+
+    def _prune_finished(self):
+        now = time.time()
+        stale = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.keep_finished_for
+        ]
+        for job_id in stale:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def running_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == "running")
+
+    def queued_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == "queued")
+
+
+def runner_from_env():
+    """
+    Build a runner sized from RCA_MAX_JOBS / RCA_MAX_QUEUED (defaults 2 / 8).
+    """
+    return RcaJobRunner(
+        max_workers=int(os.environ.get("RCA_MAX_JOBS", 2)),
+        max_queued=int(os.environ.get("RCA_MAX_QUEUED", 8)),
+    )
+
+
+# -------------- RESULT CACHE --------------
+
+
+def parse_sheet_name(raw):
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+def workbook_digest(file_bytes, sheet_name, contribution_mode="total"):
+    """
+    Cache key for one RCA run: SHA-256 of the workbook bytes plus the sheet
+    (and the contribution mode, when it is not the default).
+    """
+    digest = hashlib.sha256(file_bytes)
+    digest.update(repr(sheet_name).encode("utf-8"))
+    if contribution_mode != "total":
+        digest.update(contribution_mode.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU of labelled RCA results keyed by workbook_digest, so the
+    same upload is not recomputed by the dashboard or the HTTP service.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, rca_df):
+        with self._lock:
+            self._entries[key] = rca_df
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def compute_labelled_rca(file_bytes, sheet_name, contribution_mode="total"):
+    """
+    Read one sheet and return its labelled RCA result (empty if none).
+    Plain function so it can also run in a worker process.
+    """
+    tables = read_multiple_tables(BytesIO(file_bytes), sheet_name=sheet_name)
+    rca_df = process_rca(tables, contribution_mode=contribution_mode)
+    if rca_df.empty:
+        return rca_df
+    return add_kpi_label_column(rca_df)
+
+
+# -------------- PIPELINE JOBS --------------
+
+
+SINGLE_FILE_STAGES = [
+    "Reading workbook",
+    "Computing RCA",
+    "Labelling segments",
+    "Writing narrative",
+    "Saving outputs",
+]
+
+COMPARE_STAGES = [
+    "Reading File A",
+    "Computing RCA for File A",
+    "Labelling File A",
+    "Reading File B",
+    "Computing RCA for File B",
+    "Labelling File B",
+    "Building comparison",
+]
+
+
+def run_single_file_rca(
+    job, file_bytes, sheet_name, brand_name, output_folder="output", cache=None,
+    volume_sheet=None, contribution_mode="total", history=None, exclude_noise=False
+):
+    """
+    Single-file pipeline. Returns a dict with rca_table (the labelled result
+    as an Arrow table, None if the sheet has no RCA tables), rca_text, the
+    saved excel_path / txt_path, section_stats (reused / recomputed
+    sections when a SectionResultCache is given), reconciliation (section
+    sums vs the brand total, None if the sheet has no brand row), and
+    section_totals / contribution_mode for a WhatIfModel on the result.
+
+    volume_sheet, if given, is a sheet of the same workbook with the same
+    sections for a volume metric (e.g. subscribers); the result then gets
+    volume / mix / rate columns (see decompose_volume_rate_mix).
+    contribution_mode is passed to process_rca.
+
+    history, if given, is a list of workbook bytes of prior periods (oldest
+    first, same sheet); segments are then scored against their own history
+    (see score_significance) and, with exclude_noise, noisy drivers are
+    left out of the narrative.
+    """
+    job.set_stage("Reading workbook")
+    # one open of the workbook serves both the metric and the volume sheet
+    with WorkbookSession(file_bytes) as session:
+        tables = read_multiple_tables(session, sheet_name=sheet_name)
+        volume_tables = (
+            read_multiple_tables(session, sheet_name=volume_sheet)
+            if volume_sheet is not None else None
+        )
+    brand_total = find_brand_total(tables)
+
+    job.set_stage("Computing RCA")
+    # the totals index process_rca builds anyway (cached sections included)
+    # serves the reconciliation and the what-if model
+    rca_results, totals = process_rca(
+        tables,
+        progress_callback=job.stage_progress,
+        cache=cache,
+        contribution_mode=contribution_mode,
+        return_totals=True,
+    )
+    section_stats = dict(cache.last_stats) if cache is not None else None
+    if rca_results.empty:
+        return {"rca_table": None, "section_stats": section_stats}
+
+    reconciliation = None
+    if brand_total is not None:
+        reconciliation = reconcile_section_totals(totals, brand_total)
+
+    if volume_tables is not None:
+        volume_results = process_rca(volume_tables, contribution_mode=contribution_mode)
+        if not volume_results.empty:
+            rca_results = decompose_volume_rate_mix(rca_results, volume_results)
+
+    if history:
+        history_results = [
+            process_rca(
+                read_multiple_tables(BytesIO(period_bytes), sheet_name=sheet_name),
+                contribution_mode=contribution_mode,
+            )
+            for period_bytes in history
+        ]
+        rca_results = score_significance(rca_results, stack_history(history_results))
+
+    job.set_stage("Labelling segments")
+    rca_results = add_kpi_label_column(rca_results)
+
+    job.set_stage("Writing narrative")
+    rca_text = generate_structured_rca_text(
+        rca_results, brand_name=brand_name, exclude_noise=exclude_noise
+    )
+
+    job.set_stage("Saving outputs")
+    os.makedirs(output_folder, exist_ok=True)
+    excel_path = os.path.join(output_folder, "rca_results_single.xlsx")
+    rca_results.to_excel(excel_path, index=False)
+    txt_path = save_rca_text(
+        rca_text,
+        output_folder=output_folder,
+        filename="rca_insights_single.txt"
+    )
+
+    # hand the UI an Arrow table: it slices, projects and serialises it
+    # without further pandas copies
+    return {
+        "rca_table": rca_to_arrow(rca_results),
+        "rca_text": rca_text,
+        "excel_path": excel_path,
+        "txt_path": txt_path,
+        "section_stats": section_stats,
+        "reconciliation": reconciliation,
+        "section_totals": totals,
+        "contribution_mode": contribution_mode,
+    }
+
+
+def run_compare_rca(
+    job, bytes_a, sheet_a, bytes_b, sheet_b, result_cache=None, contribution_mode="total"
+):
+    """
+    Comparison pipeline: returns the comparison Arrow table from
+    compare_rca_tables, or None if either file has no RCA tables.
+    Files already in result_cache (same bytes, sheet and contribution mode)
+    are not recomputed; two sheets of the same upload share one workbook
+    open.
+    """
+    sessions = {}
+    results = []
+    try:
+        for name, file_bytes, sheet_name in [
+            ("File A", bytes_a, sheet_a),
+            ("File B", bytes_b, sheet_b),
+        ]:
+            key = workbook_digest(file_bytes, sheet_name, contribution_mode)
+            rca_df = result_cache.get(key) if result_cache is not None else None
+
+            if rca_df is None:
+                job.set_stage(f"Reading {name}")
+                file_key = hashlib.sha256(file_bytes).digest()
+                if file_key not in sessions:
+                    sessions[file_key] = WorkbookSession(file_bytes)
+                tables = read_multiple_tables(sessions[file_key], sheet_name=sheet_name)
+                job.set_stage(f"Computing RCA for {name}")
+                rca_df = process_rca(
+                    tables,
+                    progress_callback=job.stage_progress,
+                    contribution_mode=contribution_mode,
+                )
+                if not rca_df.empty:
+                    job.set_stage(f"Labelling {name}")
+                    rca_df = add_kpi_label_column(rca_df)
+                if result_cache is not None:
+                    result_cache.put(key, rca_df)
+
+            results.append(rca_df)
+    finally:
+        for session in sessions.values():
+            session.close()
+
+    rca_a, rca_b = results
+    if rca_a.empty or rca_b.empty:
+        return None
+
+    job.set_stage("Building comparison")
+    return compare_rca_tables(rca_to_arrow(rca_a), rca_to_arrow(rca_b))
@@ -0,0 +1,295 @@
+"""
+Anomaly alerts over periodic (e.g. daily) RCA runs.
+
+Each run's driver ranks are stored as one Parquet file per run in a
+history folder. A new run is compared with the baseline built from the
+previous runs, and segments that jump into the top negative drivers or
+whose contribution shifts sharply are written to an alert digest (JSON and
+text).
+
+    python rca_monitor.py daily_report.xlsx --history rca_history --out output
+
+Every sheet of the given workbooks is one brand; hundreds of brands go
+through the same grouped ranks and one merge against the history.
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from rca_agent_new import (
+    WorkbookSession,
+    process_rca,
+    add_kpi_label_column,
+    save_rca_text,
+    _is_multisim_inverted,
+)
+
+
+KEYS = ["Brand", "Section", "KPI Segment Label"]
+HISTORY_COLUMNS = KEYS + [
+    "Absolute Change",
+    "Contribution to Absolute Change (%)",
+    "Negative Rank",
+    "Positive Rank",
+]
+
+
+# -------------- DRIVER RANKS --------------
+
+
+def rank_drivers(rca_df):
+    """
+    Per-brand ranks of every segment in the chart (business) view:
+    "Negative Rank" 1 = biggest negative driver of the brand, "Positive
+    Rank" 1 = biggest positive one (NaN for segments on the other side).
+    rca_df is labelled RCA output with a "Brand" column, any number of
+    brands.
+    """
+    contrib = rca_df["Contribution to Absolute Change (%)"]
+    business = contrib.where(~_is_multisim_inverted(rca_df["KPI Segment Label"]), -contrib)
+
+    ranked = rca_df.copy(deep=False)
+    ranked["Negative Rank"] = business.where(business < 0).groupby(
+        rca_df["Brand"], sort=False
+    ).rank(method="min")
+    ranked["Positive Rank"] = business.where(business > 0).groupby(
+        rca_df["Brand"], sort=False
+    ).rank(method="min", ascending=False)
+    return ranked
+
+
+# -------------- HISTORY --------------
+
+
+class RcaHistory:
+    """
+    Folder of past runs, one Parquet file per run (HISTORY_COLUMNS plus
+    "Run"). Appending a run never rewrites earlier ones.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def runs(self):
+        return sorted(
+            name[:-len(".parquet")]
+            for name in os.listdir(self.path)
+            if name.endswith(".parquet")
+        )
+
+    def record(self, ranked, run_id):
+        frame = ranked[HISTORY_COLUMNS].copy()
+        frame["Run"] = run_id
+        frame.to_parquet(os.path.join(self.path, f"{run_id}.parquet"), index=False)
+
+    def baseline(self, last_runs=7, before=None):
+        """
+        Per-segment baseline over the last `last_runs` runs (before run
+        `before`, if given): mean contribution and best (lowest) negative /
+        positive rank seen. Empty when there is no history yet.
+        """
+        runs = [run for run in self.runs() if before is None or run < before]
+        runs = runs[-last_runs:]
+        if not runs:
+            return pd.DataFrame(columns=KEYS)
+
+        history = pd.concat(
+            [pd.read_parquet(os.path.join(self.path, f"{run}.parquet")) for run in runs],
+            ignore_index=True,
+        )
+        return (
+            history.groupby(KEYS, sort=False)
+            .agg(**{
+                "Baseline Contribution (%)": ("Contribution to Absolute Change (%)", "mean"),
+                "Baseline Negative Rank": ("Negative Rank", "min"),
+                "Baseline Positive Rank": ("Positive Rank", "min"),
+                "Baseline Runs": ("Run", "nunique"),
+            })
+            .reset_index()
+        )
+
+
+# -------------- ALERTS --------------
+
+
+def detect_anomalies(ranked, baseline, top_n=5, rank_jump=5, contribution_shift=10.0):
+    """
+    Compare a ranked run (rank_drivers) with a baseline (RcaHistory.baseline)
+    in one merge. Alerts:
+
+    - "New top negative driver": now within the brand's top_n negative
+      drivers, and at least rank_jump places better than its best baseline
+      rank (segments never negative before count as unranked).
+    - "Contribution shift": contribution moved at least contribution_shift
+      points away from its baseline mean.
+
+    Returns one row per alert, worst first within each brand.
+    """
+    merged = ranked[HISTORY_COLUMNS].merge(baseline, on=KEYS, how="left")
+    if "Baseline Contribution (%)" not in merged.columns:
+        return pd.DataFrame()
+    has_baseline = merged["Baseline Runs"].notna().to_numpy()
+
+    # worse than any real rank, so "never ranked" segments can jump in
+    unranked = float(len(merged) + 1)
+    current_rank = merged["Negative Rank"].fillna(unranked).to_numpy()
+    baseline_rank = merged["Baseline Negative Rank"].fillna(unranked).to_numpy(dtype=float)
+    jumped = (
+        has_baseline
+        & (current_rank <= top_n)
+        & (baseline_rank - current_rank >= rank_jump)
+    )
+
+    shift = (
+        merged["Contribution to Absolute Change (%)"] - merged["Baseline Contribution (%)"]
+    ).to_numpy(dtype=float, na_value=np.nan)
+    shifted = has_baseline & (np.abs(np.nan_to_num(shift)) >= contribution_shift)
+
+    merged["Contribution Shift (pts)"] = shift
+    alerts = pd.concat(
+        [
+            merged[jumped].assign(Alert="New top negative driver"),
+            merged[shifted].assign(Alert="Contribution shift"),
+        ],
+        ignore_index=True,
+    )
+    if alerts.empty:
+        return alerts
+    alerts["Abs Shift"] = alerts["Contribution Shift (pts)"].abs()
+    return (
+        alerts.sort_values(
+            ["Brand", "Negative Rank", "Abs Shift"],
+            ascending=[True, True, False],
+            na_position="last",
+            kind="stable",
+        )
+        .drop(columns="Abs Shift")
+        .reset_index(drop=True)
+    )
+
+
+def format_alert_digest(alerts, run_id):
+    """
+    Text digest, grouped by brand, in the same style as the RCA narrative.
+    """
+    lines = [f"RCA alerts for run {run_id}", ""]
+    if alerts.empty:
+        lines.append("No anomalies against the baseline.")
+        return "\n".join(lines)
+
+    for brand, brand_alerts in alerts.groupby("Brand", sort=False):
+        lines.append(f"{brand}:")
+        for _, row in brand_alerts.iterrows():
+            label = row["KPI Segment Label"]
+            current = row["Contribution to Absolute Change (%)"]
+            base = row["Baseline Contribution (%)"]
+            if row["Alert"] == "New top negative driver":
+                base_rank = row["Baseline Negative Rank"]
+                was = "unranked" if pd.isna(base_rank) else f"#{base_rank:.0f}"
+                lines.append(
+                    f"  - {label}: now #{row['Negative Rank']:.0f} negative driver "
+                    f"(was {was}), contribution {current:+.2f}%"
+                )
+            else:
+                lines.append(
+                    f"  - {label}: contribution {current:+.2f}% vs baseline "
+                    f"{base:+.2f}% ({current - base:+.2f} pts)"
+                )
+        lines.append("")
+    return "\n".join(lines).rstrip()
+
+
+def write_alert_digest(alerts, run_id, output_folder="output"):
+    """
+    Write rca_alerts_<run>.json (records) and rca_alerts_<run>.txt.
+    Returns both paths.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    json_path = os.path.join(output_folder, f"rca_alerts_{run_id}.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "run": run_id,
+                "alerts": json.loads(alerts.to_json(orient="records")),
+            },
+            f,
+            indent=2,
+        )
+    txt_path = save_rca_text(
+        format_alert_digest(alerts, run_id),
+        output_folder=output_folder,
+        filename=f"rca_alerts_{run_id}.txt",
+    )
+    return json_path, txt_path
+
+
+# -------------- BATCH RUN --------------
+
+
+def run_monitor(workbooks, history_path, output_folder="output", run_id=None,
+                top_n=5, rank_jump=5, contribution_shift=10.0, last_runs=7):
+    """
+    RCA for every sheet of `workbooks` (sheet name = brand), alerts against
+    the stored baseline, then record this run in the history.
+    Returns (alerts, json_path, txt_path).
+    """
+    run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+    results = []
+    for path in workbooks:
+        with WorkbookSession(path) as session:
+            for sheet_name, tables in session.iter_tables():
+                rca_df = process_rca(tables)
+                if rca_df.empty:
+                    continue
+                rca_df = add_kpi_label_column(rca_df)
+                rca_df["Brand"] = sheet_name
+                results.append(rca_df)
+    if not results:
+        raise ValueError("No valid RCA analysis found in the given workbooks.")
+
+    ranked = rank_drivers(pd.concat(results, ignore_index=True))
+    history = RcaHistory(history_path)
+    alerts = detect_anomalies(
+        ranked,
+        history.baseline(last_runs=last_runs, before=run_id),
+        top_n=top_n,
+        rank_jump=rank_jump,
+        contribution_shift=contribution_shift,
+    )
+    json_path, txt_path = write_alert_digest(alerts, run_id, output_folder)
+    history.record(ranked, run_id)
+    return alerts, json_path, txt_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RCA anomaly alerts against previous runs.")
+    parser.add_argument("workbooks", nargs="+")
+    parser.add_argument("--history", default="rca_history")
+    parser.add_argument("--out", default="output")
+    parser.add_argument("--run-id", default=None)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--rank-jump", type=int, default=5)
+    parser.add_argument("--contribution-shift", type=float, default=10.0)
+    parser.add_argument("--last-runs", type=int, default=7)
+    args = parser.parse_args()
+
+    alerts, json_path, txt_path = run_monitor(
+        args.workbooks,
+        args.history,
+        output_folder=args.out,
+        run_id=args.run_id,
+        top_n=args.top_n,
+        rank_jump=args.rank_jump,
+        contribution_shift=args.contribution_shift,
+        last_runs=args.last_runs,
+    )
+    print(f"{len(alerts)} alerts written to {json_path} and {txt_path}")
+
+
+if __name__ == "__main__":
+    main()
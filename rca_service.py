@@ -0,0 +1,186 @@
+"""
+Local HTTP service exposing the RCA engine, for schedulers and BI tools.
+
+Run it with:
+    uvicorn rca_service:app --host 127.0.0.1 --port 8000
+
+POST /rca (multipart form)
+    file    the KPI workbook (same layout as sample.xlsx)
+    sheet   sheet index or name (default 0)
+    format  json | parquet | arrow (default json)
+    use_cache  false to force a recompute (default true)
+    contribution_mode  total | gross | auto (default total), see
+               compute_rca_for_table
+
+The CPU-heavy RCA runs in a process pool (RCA_SERVICE_WORKERS, default one
+per CPU) behind the asyncio front end. Results are cached by workbook digest,
+and identical requests arriving together share one computation.
+"""
+import asyncio
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+import pandas as pd
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import Response
+
+from rca_agent_new import (
+    CONTRIBUTION_MODES,
+    rca_to_arrow,
+    arrow_to_parquet_bytes,
+    arrow_to_ipc_bytes,
+)
+from rca_jobs import (
+    ResultCache,
+    compute_labelled_rca,
+    parse_sheet_name,
+    workbook_digest,
+)
+
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# what reading a corrupt or unsupported upload raises (ValueError also
+# covers unknown formats, pyarrow's ArrowInvalid and CSV parser errors;
+# KeyError an unknown sheet)
+UNREADABLE_INPUT_ERRORS = [
+    ValueError,
+    KeyError,
+    EOFError,
+    zipfile.BadZipFile,
+    pd.errors.ParserError,
+]
+try:
+    from openpyxl.utils.exceptions import InvalidFileException
+    UNREADABLE_INPUT_ERRORS.append(InvalidFileException)
+except ImportError:
+    pass
+try:
+    from python_calamine import CalamineError
+    UNREADABLE_INPUT_ERRORS.append(CalamineError)
+except ImportError:
+    pass
+try:
+    from xlrd import XLRDError
+    UNREADABLE_INPUT_ERRORS.append(XLRDError)
+except ImportError:
+    pass
+UNREADABLE_INPUT_ERRORS = tuple(UNREADABLE_INPUT_ERRORS)
+
+_state = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    workers = int(os.environ.get("RCA_SERVICE_WORKERS", os.cpu_count() or 1))
+    _state["executor"] = ProcessPoolExecutor(max_workers=workers)
+    _state["cache"] = ResultCache(
+        max_entries=int(os.environ.get("RCA_SERVICE_CACHE_SIZE", 64))
+    )
+    _state["inflight"] = {}
+    yield
+    _state["executor"].shutdown(cancel_futures=True)
+
+
+app = FastAPI(title="Telecom Revenue RCA", lifespan=lifespan)
+
+
+async def _get_rca(file_bytes, sheet_name, use_cache, contribution_mode="total"):
+    """
+    Labelled RCA result for one sheet plus whether it came from the cache.
+    """
+    key = workbook_digest(file_bytes, sheet_name, contribution_mode)
+    cache = _state["cache"]
+    inflight = _state["inflight"]
+
+    if use_cache:
+        rca_df = cache.get(key)
+        if rca_df is not None:
+            return rca_df, key, True
+        if key in inflight:
+            return await asyncio.shield(inflight[key]), key, True
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        _state["executor"],
+        compute_labelled_rca,
+        file_bytes,
+        sheet_name,
+        contribution_mode,
+    )
+    inflight[key] = future
+    try:
+        rca_df = await asyncio.shield(future)
+    finally:
+        # a later uncached request for the same key may have replaced it
+        if inflight.get(key) is future:
+            del inflight[key]
+
+    cache.put(key, rca_df)
+    return rca_df, key, False
+
+
+def _encode(rca_df, fmt):
+    if fmt == "json":
+        return rca_df.to_json(orient="records").encode("utf-8")
+    table = rca_to_arrow(rca_df)
+    if fmt == "parquet":
+        return arrow_to_parquet_bytes(table)
+    return arrow_to_ipc_bytes(table)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "cached_results": len(_state["cache"])}
+
+
+@app.post("/rca")
+async def run_rca(
+    file: UploadFile = File(...),
+    sheet: str = Form("0"),
+    format: str = Form("json"),
+    use_cache: bool = Form(True),
+    contribution_mode: str = Form("total"),
+):
+    if format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"format must be one of {', '.join(MEDIA_TYPES)}",
+        )
+
+    if contribution_mode not in CONTRIBUTION_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"contribution_mode must be one of {', '.join(CONTRIBUTION_MODES)}",
+        )
+
+    file_bytes = await file.read()
+    try:
+        rca_df, key, cache_hit = await _get_rca(
+            file_bytes, parse_sheet_name(sheet), use_cache, contribution_mode
+        )
+    except UNREADABLE_INPUT_ERRORS as exc:
+        # unreadable workbook or unknown sheet
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if rca_df.empty:
+        raise HTTPException(
+            status_code=422, detail="No valid RCA analysis found in this sheet."
+        )
+
+    loop = asyncio.get_running_loop()
+    body = await loop.run_in_executor(None, _encode, rca_df, format)
+    return Response(
+        content=body,
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "X-RCA-Digest": key,
+            "X-RCA-Cache": "hit" if cache_hit else "miss",
+        },
+    )
@@ -0,0 +1,309 @@
+"""
+Out-of-core RCA results for large multi-brand runs.
+
+Instead of pd.concat-ing every brand / circle / month into one frame, each
+section's result is written to its own Arrow IPC (Feather v2) file and read
+back memory-mapped. Narrative, comparison and top-N work section by section
+over the mapped files, so memory stays bounded by one section at a time.
+
+    python rca_store.py Robi.xlsx Airtel.xlsx --out rca_store
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from rca_agent_new import (
+    WorkbookSession,
+    process_rca,
+    add_kpi_label_column,
+    rca_to_arrow,
+    arrow_top_k,
+    compare_rca_tables,
+    get_top_drivers_all_sections,
+    render_rca_text,
+    write_rca_report_archive,
+    NARRATIVE_SECTIONS,
+)
+
+
+MANIFEST = "manifest.jsonl"
+
+
+class RcaResultStore:
+    """
+    Directory of per-(brand, section) RCA results in Arrow IPC files.
+
+    manifest.jsonl lists one entry per file: brand, section, ordinal (the
+    section's position in the brand's sheet), file, rows. Writing a
+    (brand, ordinal) that is already stored replaces it, so a re-run into
+    the same directory does not duplicate rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._entries = []
+        manifest_path = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                self._entries = [json.loads(line) for line in f if line.strip()]
+        # manifests written before entries had an ordinal: number them in
+        # file order per brand
+        counts = {}
+        for entry in self._entries:
+            entry.setdefault("ordinal", counts.get(entry["brand"], 0))
+            counts[entry["brand"]] = entry["ordinal"] + 1
+
+    # ---------- writing ----------
+
+    def _next_file_name(self):
+        numbers = [int(entry["file"].split(".")[0]) for entry in self._entries]
+        return f"{max(numbers, default=-1) + 1:06d}.arrow"
+
+    def _rewrite_manifest(self):
+        manifest_path = os.path.join(self.path, MANIFEST)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _delete_files(self, entries):
+        for stale in entries:
+            try:
+                os.remove(os.path.join(self.path, stale["file"]))
+            except OSError:
+                # still mapped (Windows): no longer listed, so never read
+                pass
+
+    def write_section(self, rca_df, brand, ordinal=None):
+        """
+        Write one section's labelled RCA result for `brand`.
+
+        ordinal is the section's position among the brand's sections (so
+        two sections with the same name are kept apart); a stored
+        (brand, ordinal) is replaced. Default: after the brand's last one.
+        """
+        if ordinal is None:
+            ordinal = 1 + max(
+                (e["ordinal"] for e in self._entries if e["brand"] == brand), default=-1
+            )
+        rca_df = rca_df.copy(deep=False)
+        rca_df["Brand"] = brand
+        table = rca_to_arrow(rca_df)
+
+        # always a new file: the old one may still be memory-mapped
+        file_name = self._next_file_name()
+        with pa.OSFile(os.path.join(self.path, file_name), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        entry = {
+            "brand": brand,
+            "section": str(rca_df["Section"].iloc[0]),
+            "ordinal": ordinal,
+            "file": file_name,
+            "rows": table.num_rows,
+        }
+        old = [e for e in self._entries if e["brand"] == brand and e["ordinal"] == ordinal]
+        if not old:
+            self._entries.append(entry)
+            with open(os.path.join(self.path, MANIFEST), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            return
+
+        # keep the entry's place, so brand / section order is stable
+        self._entries = [
+            entry if e is old[0] else e for e in self._entries
+            if e is old[0] or e not in old
+        ]
+        self._rewrite_manifest()
+        self._delete_files(old)
+
+    def write_sheet(self, tables, brand):
+        """
+        Run RCA on one sheet's tables section by section, writing each
+        section as soon as it is computed. Replaces everything stored for
+        `brand` before. Returns the number of sections stored.
+        """
+        written = 0
+        for table in tables:
+            rca_df = process_rca([table])
+            if rca_df.empty:
+                continue
+            self.write_section(add_kpi_label_column(rca_df), brand, ordinal=written)
+            written += 1
+
+        # sections of an earlier, longer run of this brand
+        stale = [e for e in self._entries if e["brand"] == brand and e["ordinal"] >= written]
+        if stale:
+            self._entries = [e for e in self._entries if e not in stale]
+            self._rewrite_manifest()
+            self._delete_files(stale)
+        return written
+
+    # ---------- reading ----------
+
+    def manifest(self):
+        return pd.DataFrame(
+            self._entries, columns=["brand", "section", "ordinal", "file", "rows"]
+        )
+
+    @property
+    def brands(self):
+        return list(dict.fromkeys(entry["brand"] for entry in self._entries))
+
+    def _select(self, brands=None, sections=None):
+        return [
+            entry
+            for entry in self._entries
+            if (brands is None or entry["brand"] in brands)
+            and (sections is None or entry["section"] in sections)
+        ]
+
+    def open_table(self, entry, columns=None):
+        """
+        Memory-mapped Arrow table of one stored section (no data is read
+        until its buffers are touched), optionally projected on `columns`.
+        """
+        source = pa.memory_map(os.path.join(self.path, entry["file"]), "r")
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select([col for col in columns if col in table.column_names])
+        return table
+
+    def iter_tables(self, columns=None, brands=None, sections=None):
+        """
+        Yield (entry, mapped table) for every stored section that matches.
+        """
+        for entry in self._select(brands, sections):
+            yield entry, self.open_table(entry, columns)
+
+    def read_pandas(self, brands=None, sections=None, columns=None):
+        """
+        Materialise a (small) selection as one DataFrame.
+        """
+        frames = [
+            table.to_pandas()
+            for _, table in self.iter_tables(columns, brands, sections)
+        ]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+# -------------- BOUNDED-MEMORY ANALYSES --------------
+
+
+def store_top_k(store, column, k, largest=True, sign=None, absolute=False,
+                columns=None, brands=None):
+    """
+    Global top-k rows of `column` across the store: top-k per mapped
+    section, then top-k of those candidates. Holds at most k rows per
+    section in memory.
+    """
+    columns = columns or ["Brand", "Section", "KPI Segment Label", column]
+    candidates = [
+        arrow_top_k(table, column, k, largest=largest, sign=sign, absolute=absolute)
+        for _, table in store.iter_tables(columns, brands=brands)
+    ]
+    candidates = [table for table in candidates if table.num_rows]
+    if not candidates:
+        return pd.DataFrame(columns=columns)
+
+    merged = pa.concat_tables(candidates, promote_options="default")
+    return arrow_top_k(
+        merged, column, k, largest=largest, sign=sign, absolute=absolute
+    ).to_pandas()
+
+
+def store_narrative(store, brand, brand_name=None, sections=NARRATIVE_SECTIONS):
+    """
+    generate_structured_rca_text for one brand of the store, loading one
+    section at a time.
+    """
+    drivers = {}
+    for entry, table in store.iter_tables(brands=[brand], sections=sections):
+        section_df = table.to_pandas()
+        drivers.update(get_top_drivers_all_sections(section_df, [entry["section"]]))
+    return render_rca_text(drivers, brand_name or brand, sections)
+
+
+def store_compare(store, brand_a, brand_b, top_n=10, out_path=None):
+    """
+    Compare two brands section by section (see compare_rca_tables).
+    Returns the top_n segments by |Delta_ContribAbs|; if out_path is given
+    the full comparison is streamed there as an Arrow IPC file.
+    """
+    entries_b = {entry["section"]: entry for entry in store._select([brand_b])}
+    writer = None
+    candidates = []
+    try:
+        for entry_a, table_a in store.iter_tables(brands=[brand_a]):
+            entry_b = entries_b.get(entry_a["section"])
+            if entry_b is None:
+                continue
+            comparison = compare_rca_tables(table_a, store.open_table(entry_b))
+            if out_path is not None:
+                if writer is None:
+                    writer = pa.ipc.new_file(out_path, comparison.schema)
+                writer.write_table(comparison)
+            candidates.append(
+                arrow_top_k(comparison, "Delta_ContribAbs", top_n, absolute=True)
+            )
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if not candidates:
+        return pd.DataFrame()
+    merged = pa.concat_tables(candidates, promote_options="default")
+    return arrow_top_k(merged, "Delta_ContribAbs", top_n, absolute=True).to_pandas()
+
+
+# -------------- MAIN --------------
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write RCA results of every sheet of the given workbooks to an on-disk store."
+    )
+    parser.add_argument("workbooks", nargs="+")
+    parser.add_argument("--out", default="rca_store")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument(
+        "--report",
+        default=None,
+        help="also write every brand's narrative to this .zip or .xlsx"
+    )
+    args = parser.parse_args()
+
+    store = RcaResultStore(args.out)
+    for path in args.workbooks:
+        with WorkbookSession(path) as session:
+            for sheet_name, tables in session.iter_tables():
+                n = store.write_sheet(tables, brand=sheet_name)
+                print(f"{path} [{sheet_name}]: {n} sections written")
+
+    print(f"\nStore: {args.out} ({len(store.manifest())} section files)")
+    print(f"\nTop {args.top_n} negative drivers across all brands:")
+    top_neg = store_top_k(
+        store,
+        "Contribution to Absolute Change (%)",
+        args.top_n,
+        largest=False,
+        sign="negative",
+    )
+    print(top_neg.to_string(index=False))
+
+    if args.report:
+        # one brand, one mapped section at a time
+        texts = {brand: store_narrative(store, brand) for brand in store.brands}
+        write_rca_report_archive(texts, args.report)
+        print(f"\nNarratives of {len(texts)} brands written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()